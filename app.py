@@ -1,20 +1,21 @@
 import streamlit as st
 import re
-import sqlite3
 
 # ---------- Core search ----------
 from core.bot_detector import is_bot
 from core.sql_detector import needs_sql
-from core.text_to_sql import generate_sql
-from core.llm_router import route_user_input
+from core.llm_router import stream_user_input
+from core.search import search_businesses
+from core.autocomplete import get_autocomplete, suggest
 
-from db.db import run_sql, rank_results
-from db.config import DB_PATH
+from db.connection import SchemaOutdatedError, read_connection
+from db.leaderboard import start_refresher
 from ranking.explain import explain_business
 
 # ---------- Owner features ----------
+from business.business_by_name import find_businesses_by_name
 from business.business_by_phone import get_businesses_by_phone
-from business.business_update import update_business
+from business.business_update import StaleUpdateError, update_business
 from business.business_health import get_update_suggestions
 from business.business_add import add_business
 
@@ -35,106 +36,56 @@ def get_recent_businesses(limit: int = 10):
     """
     Return most recently created businesses (latest first) for customers.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, name, address, phone_number, website, category, city, state, area, created_at
-        FROM google_maps_listings
-        ORDER BY datetime(created_at) DESC
-        LIMIT ?
-        """,
-        (limit,),
-    )
-    rows = cur.fetchall()
-    conn.close()
-
-    cols = [
-        "id",
-        "name",
-        "address",
-        "phone_number",
-        "website",
-        "category",
-        "city",
-        "state",
-        "area",
-        "created_at",
-    ]
-    return [dict(zip(cols, r)) for r in rows]
+    with read_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT id, name, address, phone_number, website, category, city, state, area, created_at
+            FROM google_maps_listings
+            ORDER BY created_at DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+
+    return [dict(r) for r in rows]
 
 
 def get_owner_businesses(owner_email: str, limit: int = 10):
     """
     Businesses registered by a specific owner (latest first).
-    Requires google_maps_listings to have an owner_email column;
-    returns empty list if that column is not present.
+    Served by idx_listings_owner_created (owner_email, created_at).
     """
     if not owner_email:
         return []
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    try:
-        cur.execute(
+    with read_connection() as conn:
+        rows = conn.execute(
             """
             SELECT id, name, address, phone_number, website, category, city, state, area, created_at
             FROM google_maps_listings
             WHERE owner_email = ?
-            ORDER BY datetime(created_at) DESC
+            ORDER BY created_at DESC
             LIMIT ?
             """,
             (owner_email, limit),
-        )
-    except sqlite3.OperationalError:
-        # owner_email column missing – try to add it, then retry once
-        try:
-            cur.execute("ALTER TABLE google_maps_listings ADD COLUMN owner_email TEXT")
-            conn.commit()
-            cur.execute(
-                """
-                SELECT id, name, address, phone_number, website, category, city, state, area, created_at
-                FROM google_maps_listings
-                WHERE owner_email = ?
-                ORDER BY datetime(created_at) DESC
-                LIMIT ?
-                """,
-                (owner_email, limit),
-            )
-        except sqlite3.OperationalError:
-            conn.close()
-            return []
-
-    rows = cur.fetchall()
-    conn.close()
-
-    cols = [
-        "id",
-        "name",
-        "address",
-        "phone_number",
-        "website",
-        "category",
-        "city",
-        "state",
-        "area",
-        "created_at",
-    ]
-    return [dict(zip(cols, r)) for r in rows]
+        ).fetchall()
+
+    return [dict(r) for r in rows]
 
 
 def get_business_by_id(business_id: int):
     """Fetch full business record by its ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM google_maps_listings WHERE id = ?", (business_id,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return None
-    cols = [d[0] for d in cur.description]
-    conn.close()
-    return dict(zip(cols, row))
+    with read_connection() as conn:
+        row = conn.execute(
+            "SELECT * FROM google_maps_listings WHERE id = ?", (business_id,)
+        ).fetchone()
+    return dict(row) if row else None
+
+
+def use_suggestion(text: str):
+    """Typeahead button callback: put the completion into the search box."""
+    st.session_state.search_query = text
+
 
 # ---------- Online fallback ----------
 from online.serpapi_search import search_online, rank_online_results
@@ -151,6 +102,17 @@ st.set_page_config(
 st.title("🔍 BusinessIQ Finder")
 st.caption("Find the best local businesses or manage your own listing in a few simple steps.")
 
+try:
+    # typeahead trie: built once per server process, then kept current
+    get_autocomplete()
+except SchemaOutdatedError as e:
+    # fresh checkout / new release: migrations are a deploy step
+    st.error(f"{e} (see README.md), then reload this page.")
+    st.stop()
+
+# category leaderboards: refreshed off the request path
+start_refresher()
+
 # ================= SIMPLE AUTH & MODE SELECTION =================
 if "user_phone" not in st.session_state:
     st.session_state.user_phone = None
@@ -362,7 +324,21 @@ if st.session_state.nav == "Home" and mode == "🔍 Search Businesses":
     st.subheader("Search for Businesses")
     st.caption("Type what you are looking for (business name, service, area, category, etc.).")
 
-    query = st.text_input("What are you looking for?", placeholder="e.g. dentist in Mumbai, cafes near Andheri, digital marketing agency")
+    query = st.text_input(
+        "What are you looking for?",
+        placeholder="e.g. dentist in Mumbai, cafes near Andheri, digital marketing agency",
+        key="search_query",
+    )
+
+    # ---------- Typeahead (core/autocomplete.py) ----------
+    completions = [
+        c["text"] for c in suggest(query, k=5)
+        if c["text"].strip().lower() != query.strip().lower()
+    ]
+    if completions:
+        st.caption("Suggestions:")
+        for col, text in zip(st.columns(len(completions)), completions):
+            col.button(text, key=f"suggest_{text}", on_click=use_suggestion, args=(text,))
 
     if query:
         if is_bot(query):
@@ -371,24 +347,27 @@ if st.session_state.nav == "Home" and mode == "🔍 Search Businesses":
 
         # ---------- Decide SQL vs Chat ----------
         if needs_sql(query):
-            sql = generate_sql(query)
             result = {
                 "intent": "sql_search",
-                "sql": sql,
+                "sql": None,
                 "response": "Here are the best matching businesses:"
             }
+            st.markdown(f"💬 **Assistant:** {result['response']}")
         else:
-            result = route_user_input(query)
-
-        st.markdown(f"💬 **Assistant:** {result['response']}")
+            # tokens are rendered as they arrive (core/llm_router.py)
+            st.markdown("💬 **Assistant:**")
+            result = {
+                "intent": "chat",
+                "sql": None,
+                "response": st.write_stream(stream_user_input(query))
+            }
 
         # ---------- SQL SEARCH ----------
-        if result["intent"] == "sql_search" and result["sql"]:
-            rows = run_sql(result["sql"])
-
-            if rows:
-                ranked = rank_results(rows, query)
+        if result["intent"] == "sql_search":
+            # cached: repeated searches skip SQLite and the ranker
+            ranked = search_businesses(query)
 
+            if ranked:
                 st.subheader("Top Matching Businesses (from our database)")
 
                 for r in ranked:
@@ -464,7 +443,11 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
     st.markdown("### 🏢 Business owner tools")
 
     with st.expander("Your registered businesses (latest first)", expanded=False):
-        recent = get_owner_businesses(st.session_state.user_phone, limit=10)
+        name_filter = st.text_input("Search your businesses by name", key="owner_name_filter")
+        if name_filter:
+            recent = find_businesses_by_name(name_filter, owner_email=st.session_state.user_phone, limit=10)
+        else:
+            recent = get_owner_businesses(st.session_state.user_phone, limit=10)
         if not recent:
             st.caption("You have not registered any businesses yet using this login.")
         else:
@@ -503,6 +486,10 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
             st.subheader(f"✏️ Edit Business: {edit_biz.get('name', 'Unknown')}")
             
             form_key_edit = f"edit_business_form_{edit_biz_id}"
+            # version the form was opened with, to detect concurrent edits
+            version_key_edit = f"{form_key_edit}_version"
+            st.session_state.setdefault(version_key_edit, edit_biz.get("version"))
+
             with st.form(form_key_edit):
                 name_edit = st.text_input("Business Name", value=edit_biz.get("name", ""))
                 address_edit = st.text_input("Address", value=edit_biz.get("address", ""))
@@ -523,6 +510,7 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
             # Handle form submission outside the form context
             if cancel_edit:
                 st.session_state.owner_edit_id = None
+                st.session_state.pop(version_key_edit, None)
                 st.rerun()
             
             if save_edit:
@@ -546,14 +534,20 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
                                 "city": city_edit,
                                 "state": state_edit,
                             },
+                            expected_version=st.session_state.get(version_key_edit),
                         )
                         if result:
                             st.success("✅ Business updated successfully!")
                             st.info("Changes have been saved to your business listing.")
                             st.session_state.owner_edit_id = None
+                            st.session_state.pop(version_key_edit, None)
                             st.rerun()
                         else:
                             st.warning("No changes were made. Please check your input.")
+                    except StaleUpdateError as e:
+                        # reload the latest values on the next run
+                        st.session_state.pop(version_key_edit, None)
+                        st.error(str(e))
                     except Exception as e:
                         st.error(f"Error updating business: {str(e)}")
         else:
@@ -615,6 +609,10 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
                             current_biz = refreshed_biz
                     
                     form_key = f"phone_update_business_form_{phone}"
+                    # version the form was opened with, to detect concurrent edits
+                    version_key = f"{form_key}_version"
+                    st.session_state.setdefault(version_key, current_biz.get("version"))
+
                     with st.form(form_key):
                         st.markdown("**Edit your business details:**")
                         name_e = st.text_input("Business Name", value=current_biz.get("name", ""))
@@ -636,6 +634,7 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
                     # Handle form submission outside the form context
                     if cancel_e:
                         st.session_state[update_form_key] = False
+                        st.session_state.pop(version_key, None)
                         st.rerun()
 
                     if save_e:
@@ -659,14 +658,20 @@ if st.session_state.nav == "Home" and mode == "🏢 Business Owner":
                                         "city": city_e,
                                         "state": state_e,
                                     },
+                                    expected_version=st.session_state.get(version_key),
                                 )
                                 if result:
                                     st.success("✅ Business updated successfully!")
                                     st.info("Updated details will help your business rank better. Refreshing...")
                                     st.session_state[update_form_key] = False
+                                    st.session_state.pop(version_key, None)
                                     st.rerun()
                                 else:
                                     st.warning("No changes were made. Please check your input.")
+                            except StaleUpdateError as e:
+                                # reload the latest values on the next run
+                                st.session_state.pop(version_key, None)
+                                st.error(str(e))
                             except Exception as e:
                                 st.error(f"Error updating business: {str(e)}")
 
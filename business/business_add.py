@@ -1,7 +1,9 @@
-import sqlite3
 from datetime import datetime
 
-from db.config import DB_PATH
+from db.connection import write_transaction
+from db.derived import refresh_derived
+from db.normalize import listing_fingerprint
+from db.query_cache import bump_generation
 
 
 def add_business(
@@ -22,32 +24,10 @@ def add_business(
     """
     created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    # Idempotency / uniqueness: if a business with same name + full address + phone already exists,
-    # return its ID instead of inserting a duplicate.
-    cur.execute(
-        """
-        SELECT id FROM google_maps_listings
-        WHERE LOWER(name) = LOWER(?)
-          AND LOWER(IFNULL(address,'')) = LOWER(?)
-          AND LOWER(IFNULL(area,'')) = LOWER(?)
-          AND LOWER(IFNULL(city,'')) = LOWER(?)
-          AND LOWER(IFNULL(state,'')) = LOWER(?)
-          AND LOWER(IFNULL(phone_number,'')) = LOWER(?)
-        """,
-        (name, address or "", area or "", city or "", state or "", phone_number or ""),
-    )
-    row = cur.fetchone()
-    if row and row[0] is not None:
-        existing_id = row[0]
-        try:
-            existing_id = int(existing_id)
-        except (TypeError, ValueError):
-            pass
-        conn.close()
-        return existing_id
+    # Identity fingerprint (normalized name, address, area, city, state,
+    # phone) backed by a UNIQUE index: the insert is an indexed upsert and
+    # an existing listing with the same identity returns its own id.
+    fingerprint = listing_fingerprint(name, address, area, city, state, phone_number)
 
     base_values = (
         name,
@@ -64,59 +44,33 @@ def add_business(
         created_at,
     )
 
-    # Prefer schema with owner_email; fallback to older schema if column not present
-    try:
-        cur.execute(
+    with write_transaction() as conn:
+        row = conn.execute(
             """
             INSERT INTO google_maps_listings
             (name, address, website, phone_number,
              reviews_count, reviews_average,
-             category, subcategory, city, state, area, created_at, owner_email)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             category, subcategory, city, state, area, created_at, owner_email,
+             fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(fingerprint) DO NOTHING
+            RETURNING id
             """,
-            base_values + (owner_email or "",),
-        )
-    except sqlite3.OperationalError:
-        # old schema without owner_email
-        cur.execute(
-            """
-            INSERT INTO google_maps_listings
-            (name, address, website, phone_number,
-             reviews_count, reviews_average,
-             category, subcategory, city, state, area, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            base_values,
-        )
+            base_values + (owner_email or "", fingerprint),
+        ).fetchone()
 
-    conn.commit()
-    new_id = cur.lastrowid
-    
-    # If lastrowid is 0 or None, fetch the ID we just inserted
-    if not new_id or new_id == 0:
-        cur.execute(
-            """
-            SELECT id FROM google_maps_listings
-            WHERE LOWER(name) = LOWER(?)
-              AND LOWER(IFNULL(address,'')) = LOWER(?)
-              AND LOWER(IFNULL(area,'')) = LOWER(?)
-              AND LOWER(IFNULL(city,'')) = LOWER(?)
-              AND LOWER(IFNULL(state,'')) = LOWER(?)
-              AND LOWER(IFNULL(phone_number,'')) = LOWER(?)
-            ORDER BY id DESC
-            LIMIT 1
-            """,
-            (name, address or "", area or "", city or "", state or "", phone_number or ""),
-        )
-        row = cur.fetchone()
-        if row and row[0] is not None:
-            try:
-                new_id = int(row[0])
-            except (TypeError, ValueError):
-                pass
-    
-    conn.close()
+        if row is None:
+            # already registered
+            existing = conn.execute(
+                "SELECT id FROM google_maps_listings WHERE fingerprint = ?",
+                (fingerprint,),
+            ).fetchone()
+            return existing[0]
 
-    return new_id if new_id else None
+        new_id = row[0]
+        refresh_derived(conn, [new_id])
 
+    # cached search results may now be missing this business
+    bump_generation()
 
+    return new_id
@@ -0,0 +1,13 @@
+from db.db import trigram_search
+
+
+def find_businesses_by_name(fragment: str, owner_email: str | None = None, limit: int = 20):
+    """
+    Partial / misspelled name lookup ("sai dent", "dental clnic") through
+    the trigram index instead of LIKE '%fragment%' scans. Pass owner_email
+    to search only that owner's listings. Best matches first.
+    """
+    if not fragment or len(fragment.strip()) < 3:
+        return []
+
+    return trigram_search(fragment, column="name_norm", limit=limit, owner_email=owner_email)
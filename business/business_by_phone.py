@@ -1,21 +1,23 @@
-import sqlite3
-from db.config import DB_PATH
+from db.connection import read_connection
+from db.normalize import normalize_phone
 
 def get_businesses_by_phone(phone: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    """
+    Exact lookup on the indexed, normalized phone_norm column, so
+    "09010738078", "+91 90107 38078" and "9010738078" all match.
+    """
+    phone_norm = normalize_phone(phone)
+    if not phone_norm:
+        return []
 
-    cur.execute(
-        """
-        SELECT *
-        FROM google_maps_listings
-        WHERE phone_number LIKE ?
-        """,
-        (f"%{phone}%",)
-    )
+    with read_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT *
+            FROM google_maps_listings
+            WHERE phone_norm = ?
+            """,
+            (phone_norm,)
+        ).fetchall()
 
-    rows = cur.fetchall()
-    cols = [d[0] for d in cur.description]
-    conn.close()
-
-    return [dict(zip(cols, r)) for r in rows]
+    return [dict(r) for r in rows]
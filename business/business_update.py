@@ -1,5 +1,12 @@
-import sqlite3
-from db.config import DB_PATH
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from db.connection import write_transaction
+from db.derived import refresh_derived
+from db.normalize import normalize_phone
+from db.query_cache import bump_generation
+from db.rows import fetch_rows_by_ids
 
 ALLOWED_FIELDS = [
     "name",
@@ -13,16 +20,12 @@ ALLOWED_FIELDS = [
     "state",
 ]
 
-def update_business(business_id: int = None, updates: dict = None, phone_number: str = None):
-    """
-    Update business details directly in the existing record.
-    Can update by business_id or by phone_number if id is not available.
-    Updates all provided fields (including empty strings to clear fields).
-    Only updates fields that are in ALLOWED_FIELDS.
-    """
-    if updates is None:
-        return False
-    
+
+class StaleUpdateError(RuntimeError):
+    """The listing was changed by someone else since it was loaded."""
+
+
+def _filter_updates(updates: dict) -> dict:
     # Filter to allowed fields only, preserve all values (including empty strings)
     # Convert None to empty string for consistency
     filtered_updates = {}
@@ -34,20 +37,50 @@ def update_business(business_id: int = None, updates: dict = None, phone_number:
                 filtered_updates[k] = v.strip()
             else:
                 filtered_updates[k] = v
+    return filtered_updates
+
+
+def _now() -> str:
+    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def update_business(
+    business_id: int = None,
+    updates: dict = None,
+    phone_number: str = None,
+    expected_version: int = None,
+):
+    """
+    Update business details directly in the existing record.
+    Can update by business_id or by phone_number if id is not available.
+    Updates all provided fields (including empty strings to clear fields).
+    Only updates fields that are in ALLOWED_FIELDS.
+
+    Every update bumps the row's `version` and sets `updated_at`. Pass the
+    `version` the form was loaded with as expected_version to detect a
+    concurrent edit: StaleUpdateError is raised instead of overwriting it.
+    """
+    if updates is None:
+        return False
 
+    filtered_updates = _filter_updates(updates)
     if not filtered_updates:
         return False
 
     fields = [f"{k} = ?" for k in filtered_updates]
-    values = list(filtered_updates.values())
+    fields += ["version = version + 1", "updated_at = ?"]
+    values = list(filtered_updates.values()) + [_now()]
 
     # Determine WHERE clause - use ID if available, otherwise use phone number
     if business_id is not None:
         where_clause = "WHERE id = ?"
         values.append(business_id)
-    elif phone_number:
-        where_clause = "WHERE phone_number LIKE ?"
-        values.append(f"%{phone_number}%")
+        if expected_version is not None:
+            where_clause += " AND version = ?"
+            values.append(expected_version)
+    elif normalize_phone(phone_number):
+        where_clause = "WHERE phone_norm = ?"
+        values.append(normalize_phone(phone_number))
     else:
         return False
 
@@ -55,17 +88,100 @@ def update_business(business_id: int = None, updates: dict = None, phone_number:
         UPDATE google_maps_listings
         SET {', '.join(fields)}
         {where_clause}
+        RETURNING id
+    """
+
+    with write_transaction() as conn:
+        updated_ids = [r[0] for r in conn.execute(query, values).fetchall()]
+
+        if not updated_ids and business_id is not None and expected_version is not None:
+            exists = conn.execute(
+                "SELECT 1 FROM google_maps_listings WHERE id = ?", (business_id,)
+            ).fetchone()
+            if exists:
+                raise StaleUpdateError(
+                    f"Business {business_id} was modified by someone else. "
+                    "Reload it and apply your changes again."
+                )
+
+        refresh_derived(conn, updated_ids)
+        rows_affected = len(updated_ids)
+
+    if rows_affected > 0:
+        bump_generation()
+
+    return rows_affected > 0
+
+
+def bulk_update_businesses(changes: Iterable[Tuple]) -> Dict[str, List[int]]:
     """
+    Apply many corrections in ONE write transaction.
+
+    `changes` holds (business_id, updates) or
+    (business_id, updates, expected_version) tuples. Rows are grouped by
+    the set of columns they change so each group is a single executemany.
+
+    Returns {"updated": [...], "conflicts": [...], "missing": [...]} ids.
+    A row whose current version differs from its expected_version is a
+    conflict and is left untouched; the rest of the batch still applies.
+    """
+    # merge repeated ids (later fields win, first expected_version counts)
+    merged: "OrderedDict[int, list]" = OrderedDict()
+    for change in changes:
+        business_id, updates = change[0], change[1]
+        expected_version = change[2] if len(change) > 2 else None
+
+        filtered_updates = _filter_updates(updates or {})
+        if not filtered_updates:
+            continue
+
+        if business_id in merged:
+            merged[business_id][0].update(filtered_updates)
+        else:
+            merged[business_id] = [filtered_updates, expected_version]
+
+    result = {"updated": [], "conflicts": [], "missing": []}
+    if not merged:
+        return result
+
+    now = _now()
+
+    with write_transaction() as conn:
+        # current versions, read under the write lock so they cannot change
+        versions = {
+            r["id"]: r["version"]
+            for r in fetch_rows_by_ids(conn, merged, ["id", "version"])
+        }
+
+        groups: Dict[tuple, list] = {}
+        for business_id, (filtered_updates, expected_version) in merged.items():
+            if business_id not in versions:
+                result["missing"].append(business_id)
+                continue
+            if expected_version is not None and versions[business_id] != expected_version:
+                result["conflicts"].append(business_id)
+                continue
+
+            columns = tuple(sorted(filtered_updates))
+            groups.setdefault(columns, []).append(
+                tuple(filtered_updates[c] for c in columns) + (now, business_id)
+            )
+            result["updated"].append(business_id)
+
+        for columns, params in groups.items():
+            assignments = ", ".join(f"{c} = ?" for c in columns)
+            conn.executemany(
+                f"""
+                UPDATE google_maps_listings
+                SET {assignments}, version = version + 1, updated_at = ?
+                WHERE id = ?
+                """,
+                params,
+            )
+
+        refresh_derived(conn, result["updated"])
+
+    if result["updated"]:
+        bump_generation()
 
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    try:
-        cur.execute(query, values)
-        rows_affected = cur.rowcount
-        conn.commit()
-        return rows_affected > 0
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    return result
@@ -0,0 +1,246 @@
+# core/autocomplete.py
+"""
+Typeahead completions for the search box.
+
+Business names, categories / subcategories, areas and cities are kept in
+an in-memory radix (compressed prefix) trie keyed by normalized text.
+Every node caches the TOP_K heaviest completions below it, so
+
+    suggest("biry")  ->  [{"text": "Biryani Restaurants", "kind": "category", ...}, ...]
+
+is a walk down at most len(prefix) characters plus a slice, with no
+traversal of the subtree.
+
+A completion's weight is the popularity of the listings behind it:
+(1 + log1p(reviews_count)) * rating / 5 per listing, summed, so a
+category or city weighs as much as all of its listings together.
+
+The trie is built from the database on first use (app.py warms it at
+startup) and follows the change log (db/changes.py): each listing's
+contributions are remembered, so edits and deletes move weights
+instead of only adding to them.
+"""
+import math
+from typing import Dict, List, Optional, Tuple
+
+from core.gazetteer import is_place_like
+from db.changes import LiveIndex
+from db.connection import read_connection
+from db.normalize import normalize_text
+from ranking.batch_ranker import DEFAULT_RATING
+
+TOP_K = 10
+
+# (kind, source column); the display text is the original column value
+COMPLETION_FIELDS = [
+    ("name", "name"),
+    ("category", "category"),
+    ("category", "subcategory"),
+    ("area", "area"),
+    ("city", "city"),
+]
+
+_SOURCE_COLUMNS = (
+    ["id", "reviews_count", "reviews_average", "is_permanently_closed"]
+    + [column for _, column in COMPLETION_FIELDS]
+)
+
+
+class _Node:
+    __slots__ = ("edges", "key", "weight", "top")
+
+    def __init__(self):
+        self.edges: Dict[str, Tuple[str, "_Node"]] = {}   # first char -> (label, child)
+        self.key: Optional[str] = None   # completion ending here, if any
+        self.weight = 0.0
+        self.top: List[Tuple[float, str]] = []          # (weight, key), heaviest first
+
+
+class Autocomplete:
+    """Radix trie of weighted completions with per-node top-k caches."""
+
+    def __init__(self, top_k: int = TOP_K):
+        self.top_k = top_k
+        self._root = _Node()
+        self._display: Dict[str, str] = {}
+        self._kinds: Dict[str, Dict[str, float]] = {}
+        # listing id -> [(key, kind, weight)] it contributed
+        self._contributions: Dict[int, List[Tuple[str, str, float]]] = {}
+
+    # ------------------------------
+    # Trie maintenance
+    # ------------------------------
+    def _path(self, key: str) -> List[_Node]:
+        """Nodes from the root to `key`'s node, splitting edges as needed."""
+        node, path, rest = self._root, [self._root], key
+        while rest:
+            edge = node.edges.get(rest[0])
+            if edge is None:
+                child = _Node()
+                node.edges[rest[0]] = (rest, child)
+                path.append(child)
+                return path
+
+            label, child = edge
+            common = 0
+            while common < min(len(label), len(rest)) and label[common] == rest[common]:
+                common += 1
+
+            if common < len(label):
+                # split "label" into "label[:common]" -> "label[common:]"
+                middle = _Node()
+                middle.edges[label[common]] = (label[common:], child)
+                middle.top = list(child.top)
+                node.edges[rest[0]] = (label[:common], middle)
+                child = middle
+
+            node, rest = child, rest[common:]
+            path.append(node)
+        return path
+
+    def _refresh_top(self, node: _Node) -> None:
+        candidates = []
+        if node.weight > 0:
+            candidates.append((node.weight, node.key))
+        for _, child in node.edges.values():
+            candidates.extend(child.top)
+        candidates.sort(key=lambda item: -item[0])
+        node.top = candidates[:self.top_k]
+
+    def _set_weight(self, key: str, delta: float, kind: str, display: Optional[str]) -> None:
+        path = self._path(key)
+        node = path[-1]
+        node.key = key
+        node.weight = node.weight + delta
+        if node.weight < 1e-9:
+            node.weight = 0.0
+
+        kinds = self._kinds.setdefault(key, {})
+        kinds[kind] = kinds.get(kind, 0.0) + delta
+        if display and key not in self._display:
+            self._display[key] = display
+        if node.weight == 0.0:
+            self._kinds.pop(key, None)
+            self._display.pop(key, None)
+
+        for n in reversed(path):
+            self._refresh_top(n)
+
+    # ------------------------------
+    # Listings
+    # ------------------------------
+    @staticmethod
+    def listing_weight(row) -> float:
+        rating = row["reviews_average"]
+        rating = DEFAULT_RATING if rating is None else float(rating)
+        return (1.0 + math.log1p(max(row["reviews_count"] or 0, 0))) * rating / 5.0
+
+    def _entries(self, row):
+        """(key, kind, weight, display text) completions contributed by a listing."""
+        if row["is_permanently_closed"]:
+            return
+        weight = self.listing_weight(row)
+        for kind, column in COMPLETION_FIELDS:
+            text = (row[column] or "").strip()
+            key = normalize_text(text)
+            if key and (kind != "area" or is_place_like(key)):
+                yield key, kind, weight, text
+
+    def add_listing(self, row) -> None:
+        self.remove_listing(row["id"])
+        added = []
+        for key, kind, weight, text in self._entries(row):
+            self._set_weight(key, weight, kind, text)
+            added.append((key, kind, weight))
+        self._contributions[row["id"]] = added
+
+    def load(self, rows) -> None:
+        """Bulk build: aggregate every weight first, then fill all top-k caches in one pass."""
+        totals: Dict[str, float] = {}
+        for row in rows:
+            added = []
+            for key, kind, weight, text in self._entries(row):
+                totals[key] = totals.get(key, 0.0) + weight
+                kinds = self._kinds.setdefault(key, {})
+                kinds[kind] = kinds.get(kind, 0.0) + weight
+                self._display.setdefault(key, text)
+                added.append((key, kind, weight))
+            self._contributions[row["id"]] = added
+
+        for key, weight in totals.items():
+            node = self._path(key)[-1]
+            node.key, node.weight = key, weight
+
+        # post-order: children before parents
+        stack, order = [self._root], []
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(child for _, child in node.edges.values())
+        for node in reversed(order):
+            self._refresh_top(node)
+
+    def remove_listing(self, listing_id: int) -> None:
+        for key, kind, weight in self._contributions.pop(listing_id, []):
+            self._set_weight(key, -weight, kind, None)
+
+    # ------------------------------
+    # Lookup
+    # ------------------------------
+    def suggest(self, prefix: str, k: int = 8) -> List[Dict]:
+        rest = normalize_text(prefix)
+        node = self._root
+        while rest:
+            edge = node.edges.get(rest[0])
+            if edge is None:
+                return []
+            label, child = edge
+            if label.startswith(rest):
+                node, rest = child, ""
+            elif rest.startswith(label):
+                node, rest = child, rest[len(label):]
+            else:
+                return []
+
+        out = []
+        for weight, key in node.top[:k]:
+            kinds = self._kinds.get(key, {})
+            out.append({
+                "text": self._display.get(key, key),
+                "kind": max(kinds, key=kinds.get) if kinds else None,
+                "weight": round(weight, 3),
+            })
+        return out
+
+
+# ============================================================
+# Loading (lazy, once per process) + change-log updates
+# ============================================================
+def _build() -> Autocomplete:
+    completer = Autocomplete()
+    with read_connection() as conn:
+        completer.load(conn.execute(
+            f"SELECT {', '.join(_SOURCE_COLUMNS)} FROM google_maps_listings"
+        ))
+    return completer
+
+
+def _update(completer: Autocomplete, rows, deleted) -> None:
+    for listing_id in deleted:
+        completer.remove_listing(listing_id)
+    for r in rows:
+        completer.add_listing(r)
+
+
+_completer = LiveIndex(_build, _update, _SOURCE_COLUMNS)
+
+
+def get_autocomplete() -> Autocomplete:
+    return _completer.get()
+
+
+def suggest(prefix: str, k: int = 8) -> List[Dict]:
+    """Top-k completions for a partially typed query, heaviest first."""
+    if not prefix or not prefix.strip():
+        return []
+    return get_autocomplete().suggest(prefix, k)
@@ -0,0 +1,255 @@
+# core/gazetteer.py
+"""
+Gazetteer-based entity extraction for search queries.
+
+Distinct cities, areas, states and categories are loaded once from
+google_maps_listings into a word-level trie. tag() walks the normalized
+query once, taking the longest known phrase at each position, so
+
+    "cafes near kotla bazaar"   -> area  'kotla bazaar'
+    "dentist gajuwaka"          -> city  'gajuwaka'
+    "biryani restaurant chirala"-> category 'biryani restaurants', city 'chirala'
+
+and generate_sql can turn places into equality predicates on the
+indexed *_norm columns instead of guessing a city from " in ".
+
+Places also get a centre (the mean coordinates of their listings, see
+db/geo.py), so "near <place>" can become a radius search around it.
+
+The gazetteer follows the change log (db/changes.py): names introduced
+by new or edited listings are added on the next lookup, areas once they
+reach MIN_AREA_LISTINGS, and place centres move with their listings.
+Names are never removed.
+"""
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from db.changes import LiveIndex
+from db.connection import read_connection
+from db.geo import CITY_REFERENCE_POINTS
+from db.leaderboard import category_variants
+from db.normalize import normalize_text
+
+# Preference when one phrase is several kinds of entity
+KIND_PRIORITY = ["city", "area", "state", "category"]
+
+# area is free text scraped from addresses ("main road", "near",
+# "ground floor" ...); only recurring, place-like values are kept
+MIN_AREA_LISTINGS = 3
+AREA_NOISE_WORDS = {
+    "near", "opp", "opposite", "beside", "besides", "behind", "to", "old",
+    "road", "rd", "st", "street", "highway", "bypass", "line", "lane",
+    "floor", "shop", "no", "building", "complex", "towers", "avenue",
+    "main", "bus", "stand", "stop", "office", "branch", "area", "unnamed",
+    "center", "centre", "school", "bank", "hospital", "theatre", "petrol",
+    "pump", "restaurant", "parlour", "trust", "gardens", "downstairs",
+}
+
+# Words asking for listings around a place rather than in it
+PROXIMITY_WORDS = {"near", "nearby", "around"}
+
+
+class Span(NamedTuple):
+    start: int          # word offsets in the normalized query
+    end: int
+    text: str
+    kinds: Dict[str, str]   # kind -> canonical value
+
+
+class Gazetteer:
+    """Word-level trie of known place / category phrases."""
+
+    _END = ""   # child key holding the {kind: value} payload
+
+    def __init__(self):
+        self._root: Dict = {}
+        self.size = 0
+        self.centers: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # per listing (city, area, lat, lon) it contributed, so edits and
+        # deletes move area counts and centres instead of only adding
+        self._places: Dict[int, Tuple] = {}
+        self._area_counts: Counter = Counter()
+        self._coordinate_sums: Dict[Tuple[str, str], List[float]] = {}
+
+    def add(self, phrase: str, kind: str, value: Optional[str] = None) -> None:
+        words = normalize_text(phrase).split()
+        if not words:
+            return
+        node = self._root
+        for w in words:
+            node = node.setdefault(w, {})
+        payload = node.setdefault(self._END, {})
+        if kind not in payload:
+            payload[kind] = value or " ".join(words)
+            self.size += 1
+
+    def add_category(self, category: str) -> None:
+        """A category plus its singular / plural spellings."""
+        for variant in category_variants(category):
+            self.add(variant, "category", value=category)
+
+    def _move(self, place: Tuple, sign: int) -> None:
+        city, area, lat, lon = place
+        if area:
+            self._area_counts[area] += sign
+            if self._area_counts[area] <= 0:
+                del self._area_counts[area]
+            elif sign > 0 and self._area_counts[area] == MIN_AREA_LISTINGS:
+                self.add(area, "area")
+
+        if lat is None or lon is None:
+            return
+        for key in (("city", city), ("area", area)):
+            if not key[1]:
+                continue
+            sums = self._coordinate_sums.setdefault(key, [0.0, 0.0, 0])
+            sums[0] += sign * lat
+            sums[1] += sign * lon
+            sums[2] += sign
+            if sums[2] <= 0:
+                del self._coordinate_sums[key]
+                self.centers.pop(key, None)
+            else:
+                self.centers[key] = (round(sums[0] / sums[2], 6), round(sums[1] / sums[2], 6))
+
+    def add_place(self, listing_id: int, city: str, area: str, lat: Optional[float], lon: Optional[float]) -> None:
+        """Count a listing toward its area and city centre (replacing its previous place)."""
+        self.remove_place(listing_id)
+        place = (city or None, area if area and is_place_like(area) else None, lat, lon)
+        self._places[listing_id] = place
+        self._move(place, +1)
+
+    def remove_place(self, listing_id: int) -> None:
+        place = self._places.pop(listing_id, None)
+        if place is not None:
+            self._move(place, -1)
+
+    def center(self, kind: str, value: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) of a city / area, if any of its listings has coordinates."""
+        point = self.centers.get((kind, value))
+        if point is None and kind == "city":
+            point = CITY_REFERENCE_POINTS.get(value)
+        return point
+
+    def tag(self, text: str) -> List[Span]:
+        """Longest-match, left-to-right, non-overlapping entity spans."""
+        words = normalize_text(text).split()
+        spans = []
+        i = 0
+        while i < len(words):
+            node = self._root
+            best = None
+            for j in range(i, len(words)):
+                node = node.get(words[j])
+                if node is None:
+                    break
+                if self._END in node:
+                    best = (j + 1, node[self._END])
+            if best is None:
+                i += 1
+                continue
+            end, kinds = best
+            spans.append(Span(i, end, " ".join(words[i:end]), dict(kinds)))
+            i = end
+        return spans
+
+
+# ============================================================
+# Loading (lazy, once per process) + change-log updates
+# ============================================================
+def is_place_like(area: str) -> bool:
+    """Whether a normalized area value looks like a locality, not an address fragment."""
+    words = area.split()
+    return (
+        len(area) >= 4
+        and not any(ch.isdigit() for ch in area)
+        and not AREA_NOISE_WORDS.intersection(words)
+    )
+
+
+def _add_row(gaz: Gazetteer, r) -> None:
+    if r["city_norm"]:
+        gaz.add(r["city_norm"], "city")
+    if r["state_norm"]:
+        gaz.add(r["state_norm"], "state")
+    for field in ("category_norm", "subcategory_norm"):
+        if r[field]:
+            gaz.add_category(r[field])
+
+
+def _load() -> Gazetteer:
+    gaz = Gazetteer()
+    with read_connection() as conn:
+        for r in conn.execute(
+            """
+            SELECT DISTINCT city_norm, state_norm, category_norm, subcategory_norm
+            FROM google_maps_listings
+            """
+        ):
+            _add_row(gaz, r)
+
+        for r in conn.execute(
+            "SELECT id, city_norm, area_norm, lat, lon FROM google_maps_listings"
+        ):
+            gaz.add_place(r["id"], r["city_norm"], r["area_norm"], r["lat"], r["lon"])
+    return gaz
+
+
+def _update(gaz: Gazetteer, rows, deleted) -> None:
+    for listing_id in deleted:
+        gaz.remove_place(listing_id)
+    for r in rows:
+        _add_row(gaz, r)
+        gaz.add_place(r["id"], r["city_norm"], r["area_norm"], r["lat"], r["lon"])
+
+
+_gazetteer = LiveIndex(_load, _update, [
+    "id", "city_norm", "state_norm", "category_norm", "subcategory_norm",
+    "area_norm", "lat", "lon",
+])
+
+
+def get_gazetteer() -> Gazetteer:
+    return _gazetteer.get()
+
+
+# ============================================================
+# Structured filters
+# ============================================================
+def extract_entities(query: str) -> Dict:
+    """
+    'best biryani restaurants near kotla bazaar' ->
+        {"city": None, "area": "kotla bazaar", "state": None,
+         "category": "biryani restaurants", "category_text": "biryani restaurants",
+         "terms": ["best", "biryani", "restaurants", "near"],
+         "near": True, "center": (17.69, 83.2)}
+
+    The first place of each kind becomes a filter; place words are removed
+    from `terms`, category words are kept (they still drive FTS matching).
+    `near` is set when a proximity word appears; `center` is the
+    coordinates of the most specific place found (area, then city), or None.
+    """
+    words = normalize_text(query).split()
+    entities = {"city": None, "area": None, "state": None, "category": None, "category_text": None}
+    place_words = set()
+    gazetteer = get_gazetteer()
+
+    for span in gazetteer.tag(query):
+        kind = next(k for k in KIND_PRIORITY if k in span.kinds)
+        if entities[kind] is not None:
+            continue
+        entities[kind] = span.kinds[kind]
+        if kind == "category":
+            entities["category_text"] = span.text
+        else:
+            place_words.update(range(span.start, span.end))
+
+    entities["terms"] = [w for i, w in enumerate(words) if i not in place_words]
+    entities["near"] = bool(PROXIMITY_WORDS.intersection(words))
+    entities["center"] = None
+    for kind in ("area", "city"):
+        if entities[kind]:
+            entities["center"] = gazetteer.center(kind, entities[kind])
+            if entities["center"]:
+                break
+    return entities
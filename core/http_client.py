@@ -0,0 +1,95 @@
+# core/http_client.py
+"""
+Shared HTTP transport for the external APIs (OpenRouter, SerpAPI).
+
+One requests.Session per host, created on first use and kept for the
+life of the process, so calls reuse kept-alive TCP / TLS connections
+instead of handshaking every time. Each session's adapter:
+
+- keeps at most POOL_MAXSIZE connections to its host and blocks callers
+  beyond that (bounded sockets under load),
+- retries connection failures and 502/503/504 answers with exponential
+  backoff (honouring Retry-After); 429 is left to the caller, which may
+  switch API keys instead of waiting.
+
+Timeouts are (connect, read): an unreachable host fails after
+CONNECT_TIMEOUT seconds, a slow completion still gets READ_TIMEOUT.
+
+    r = http_client.post(OPENROUTER_URL, headers=..., json=payload)
+"""
+import threading
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+POOL_MAXSIZE = 10
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 30.0
+DEFAULT_TIMEOUT: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5             # seconds, doubled per attempt
+RETRY_STATUSES = (502, 503, 504)
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def _retry_policy() -> Retry:
+    return Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=0,                 # a read timeout may mean the request was processed
+        status=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "POST"}),
+        backoff_factor=RETRY_BACKOFF,
+        respect_retry_after_header=True,
+        raise_on_status=False,  # hand the last response to raise_for_status()
+    )
+
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=POOL_MAXSIZE,
+        pool_block=True,
+        max_retries=_retry_policy(),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url: str) -> requests.Session:
+    """The pooled session for `url`'s scheme + host."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    with _lock:
+        session = _sessions.get(origin)
+        if session is None:
+            session = _sessions[origin] = _new_session()
+        return session
+
+
+def request(method: str, url: str, timeout=DEFAULT_TIMEOUT, **kwargs) -> requests.Response:
+    return get_session(url).request(method, url, timeout=timeout, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def close_all() -> None:
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -1,46 +1,157 @@
 import os
 import json
-import requests
+from typing import Iterator
+
 from dotenv import load_dotenv
 
+from core import http_client
 from llm.models import MODEL
 from llm.prompts import CHAT_SYSTEM_PROMPT
+from core.single_flight import SingleFlight
+from llm.response_cache import cache_key, get_response_cache
 
 load_dotenv()
 
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
 
-def route_user_input(user_text: str) -> dict:
+TEMPERATURE = 0.3
+MAX_TOKENS = 300
+
+# Identical in-flight questions share one call (core/single_flight.py)
+FLIGHTS = SingleFlight()
+FLIGHT_TIMEOUT = 60
+
+def _payload(user_text: str, stream: bool = False) -> dict:
     payload = {
         "model": MODEL,
         "messages": [
             {"role": "system", "content": CHAT_SYSTEM_PROMPT},
             {"role": "user", "content": user_text}
         ],
-        "temperature": 0.3,
-        "max_tokens": 300
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS
     }
+    if stream:
+        payload["stream"] = True
+    return payload
+
 
-    headers = {
+def _headers() -> dict:
+    return {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
         "HTTP-Referer": "http://localhost:8501",
         "X-Title": "BusinessIQ Finder"
     }
 
-    r = requests.post(
+
+def _flight_key(user_text: str):
+    return ("chat", cache_key(MODEL, CHAT_SYSTEM_PROMPT, TEMPERATURE, user_text))
+
+
+def _fetch_answer(user_text: str) -> str:
+    # pooled keep-alive session, (connect, read) timeouts
+    r = http_client.post(
         OPENROUTER_URL,
-        headers=headers,
-        json=payload,
-        timeout=30
+        headers=_headers(),
+        json=_payload(user_text)
     )
 
     r.raise_for_status()
     answer = r.json()["choices"][0]["message"]["content"]
+    get_response_cache().put(MODEL, CHAT_SYSTEM_PROMPT, TEMPERATURE, user_text, answer)
+    return answer
+
+
+def route_user_input(user_text: str) -> dict:
+    # repeated questions are answered from llm/response_cache.py
+    answer = get_response_cache().get(MODEL, CHAT_SYSTEM_PROMPT, TEMPERATURE, user_text)
+    if answer is None:
+        # concurrent identical questions share one API call
+        answer = FLIGHTS.do(
+            _flight_key(user_text),
+            lambda: _fetch_answer(user_text),
+            timeout=FLIGHT_TIMEOUT
+        )
 
     return {
         "intent": "chat",
         "sql": None,
         "response": answer
     }
+
+
+def _stream_answer(user_text: str, parts: list) -> Iterator[str]:
+    """
+    OpenRouter SSE deltas; the answer is cached once the stream completes.
+    A stream that ends without [DONE] raises after its last delta.
+    """
+    with http_client.post(
+        OPENROUTER_URL,
+        headers=_headers(),
+        json=_payload(user_text, stream=True),
+        stream=True
+    ) as r:
+        r.raise_for_status()
+        r.encoding = "utf-8"
+
+        for line in r.iter_lines(decode_unicode=True):
+            # blank lines separate events; ":" lines are keep-alive comments
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                break
+
+            event = json.loads(data)
+            if "error" in event:
+                raise RuntimeError(f"OpenRouter stream error: {event['error']}")
+
+            for choice in event.get("choices", []):
+                text = (choice.get("delta") or {}).get("content")
+                if text:
+                    parts.append(text)
+                    yield text
+        else:
+            # connection closed without [DONE]: a partial answer must
+            # neither be cached nor handed to waiting sessions as complete
+            raise RuntimeError("OpenRouter stream ended before [DONE]")
+
+    get_response_cache().put(MODEL, CHAT_SYSTEM_PROMPT, TEMPERATURE, user_text, "".join(parts))
+
+
+def stream_user_input(user_text: str) -> Iterator[str]:
+    """
+    Same answer as route_user_input, yielded in pieces as OpenRouter
+    streams it (server-sent events), for st.write_stream. Cached answers
+    come back as a single piece; a completed stream is cached.
+
+    While one session streams an answer, sessions asking the same
+    question wait for it and receive the full text in one piece.
+    """
+    answer = get_response_cache().get(MODEL, CHAT_SYSTEM_PROMPT, TEMPERATURE, user_text)
+    if answer is not None:
+        yield answer
+        return
+
+    key = _flight_key(user_text)
+    future, leader = FLIGHTS.join(key)
+    if not leader:
+        yield future.result(timeout=FLIGHT_TIMEOUT)
+        return
+
+    parts = []
+    try:
+        yield from _stream_answer(user_text, parts)
+    except GeneratorExit:
+        # the leader's page was rerun / closed mid-stream
+        future.set_exception(RuntimeError("Answer stream was abandoned"))
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result("".join(parts))
+    finally:
+        FLIGHTS.forget(key, future)
@@ -0,0 +1,132 @@
+from typing import Dict, Iterator, List
+
+from core.spelling import correct_query
+from core.text_to_sql import (
+    generate_ids_sql,
+    generate_sql,
+    parse_category_city,
+    parse_query,
+)
+from db.changes import cached_latest_seq
+from db.db import iter_sql, rank_results, trigram_search
+from db.leaderboard import (
+    LEADERBOARD_DEPTH,
+    board_candidates,
+    board_label,
+    boards_current,
+    category_variants,
+    leaderboard_rows,
+)
+from db.normalize import normalize_text
+from db.query_cache import QueryCache, current_generation, normalize_query
+from db.semantic_index import semantic_search
+
+# Final ranked top-N per normalized query
+SEARCH_CACHE = QueryCache(max_entries=2048, ttl_seconds=900)
+
+# Nearest neighbours from the semantic index (db/semantic_index.py)
+# added to the keyword candidates
+SEMANTIC_CANDIDATES = 50
+SEMANTIC_MIN_SIMILARITY = 0.75
+
+
+def candidate_rows(query: str) -> Iterator[Dict]:
+    """
+    FTS keyword matches, then semantic matches the keywords missed
+    ("tooth doctor" -> dentists), both under the query's place filters.
+    """
+    seen = set()
+    sql = generate_sql(query)
+    if sql is None:
+        return
+
+    for r in iter_sql(sql):
+        seen.add(r["id"])
+        yield r
+
+    keywords, filters, _ = parse_query(query)
+    if not keywords:
+        return
+
+    hits = semantic_search(
+        " ".join(keywords),
+        k=SEMANTIC_CANDIDATES,
+        min_similarity=SEMANTIC_MIN_SIMILARITY,
+    )
+    ids = [i for i, _ in hits if i not in seen]
+    if ids:
+        yield from iter_sql(generate_ids_sql(ids, filters))
+
+
+def _rank(query: str, top_n: int, head: int) -> List[Dict]:
+    keywords, _, origin = parse_query(query)
+
+    rows, rank_query = None, query
+    parsed = parse_category_city(query)
+    label = board_label(parsed[1], category_variants(parsed[0])) if parsed else None
+    if label is not None:
+        # "best <category> in <city>": one city/category board
+        city = parsed[1]
+        rank_query = label
+        if top_n <= LEADERBOARD_DEPTH and boards_current(head):
+            rows = leaderboard_rows(city, label)
+        else:
+            rows = board_candidates(city, label)
+
+    if rows is None:
+        # candidates are streamed from the cursor into the top-k ranker
+        rows = candidate_rows(query)
+
+    return rank_results(rows, rank_query, top_n=top_n, origin=origin)
+
+
+def search_businesses(query: str, top_n: int = 10) -> List[Dict]:
+    """
+    generate_sql -> iter_sql -> rank_results, answered from SEARCH_CACHE
+    when the same (normalized) query was ranked since the last write.
+    Exact "<category> in <city>" queries are ranked over the listings of
+    that city and category, with the category as the query, read from the
+    precomputed leaderboard when top_n fits on it and the boards are up to
+    date; both give the same order (db/leaderboard.py).
+    Queries that fill fewer than top_n results as typed are topped up with
+    misspelled words corrected; if that still matches nothing they fall
+    back to fuzzy name search on the trigram index, under the same place
+    filters.
+    "near <place>" queries are ranked with distance from the place.
+
+    The generation includes the change-log head, so writes made outside
+    this process (bulk loads, scripts) also invalidate cached results,
+    within HEAD_POLL_SECONDS (db/changes.py).
+    """
+    key = (normalize_query(query), top_n)
+    generation = (current_generation(), cached_latest_seq())
+
+    cached = SEARCH_CACHE.get(key, generation=generation)
+    if cached is not None:
+        return list(cached)
+
+    ranked = _rank(query, top_n, generation[1])
+
+    if len(ranked) < top_n:
+        # typo correction against the place / category vocabulary
+        # (core/spelling.py); matches of the query as typed stay first
+        corrected = correct_query(query)
+        if corrected != normalize_text(query):
+            seen = {r["id"] for r in ranked}
+            more = [r for r in _rank(corrected, top_n, generation[1]) if r["id"] not in seen]
+            ranked = list(ranked) + more[:top_n - len(ranked)]
+            if not seen:
+                query = corrected
+
+    if not ranked:
+        # no whole-word match: partial / misspelled business names, still
+        # within the requested place (nothing there -> empty result, so
+        # the caller can search online). Queries of stop words only have
+        # no name to look for.
+        keywords, filters, origin = parse_query(query)
+        if keywords:
+            fuzzy = trigram_search(" ".join(keywords), limit=top_n, filters=filters)
+            ranked = rank_results(fuzzy, query, top_n=top_n, origin=origin)
+
+    SEARCH_CACHE.put(key, ranked, generation=generation)
+    return list(ranked)
@@ -0,0 +1,84 @@
+# core/single_flight.py
+"""
+Process-wide coalescing of identical in-flight calls.
+
+When several Streamlit sessions ask the same external question at the
+same moment, only the first caller (the leader) runs it; the others wait
+on the leader's Future and get the same result, or the same exception.
+Once the call finishes the key is forgotten, so later callers start a
+fresh call (caching is a separate concern, see llm/response_cache.py).
+
+    flights = SingleFlight()
+    results = flights.do(("serpapi", normalize_query(q)), lambda: fetch(q), timeout=60)
+
+Callers that cannot wrap their work in one function (streaming) use
+join() / forget() directly:
+
+    future, leader = flights.join(key)
+    if not leader:
+        return future.result(timeout)
+    try:
+        ...; future.set_result(value)
+    except Exception as e:
+        future.set_exception(e); raise
+    finally:
+        flights.forget(key, future)
+"""
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+DEFAULT_TIMEOUT = 60.0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def join(self, key: Hashable) -> Tuple[Future, bool]:
+        """The in-flight Future for `key` and whether the caller leads it."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self.calls += 1
+            return future, True
+
+    def forget(self, key: Hashable, future: Future) -> None:
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = DEFAULT_TIMEOUT) -> Any:
+        """
+        fn() run once for all concurrent callers with the same key.
+        Followers raise concurrent.futures.TimeoutError after `timeout`
+        seconds; the leader's call itself is not interrupted.
+        """
+        future, leader = self.join(key)
+        if not leader:
+            return future.result(timeout=timeout)
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.forget(key, future)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "calls": self.calls,
+                "shared": self.shared,
+            }
@@ -0,0 +1,205 @@
+# core/spelling.py
+"""
+Typo correction for search queries (SymSpell-style).
+
+Every word of the place and category vocabulary (categories,
+subcategories, cities, areas) is indexed under all of its deletions up to
+MAX_EDIT_DISTANCE, computed once. A query word is corrected by
+generating its own deletions and looking them up: no scan over the
+vocabulary, so a lookup is a few dict probes plus an edit-distance check
+on the handful of candidates.
+
+    correct_query("resturant in gajuwka") -> "restaurant in gajuwaka"
+
+Business names are left out: they are full of rare words that ordinary
+query words ("gym", "lawyer") sit one or two edits away from. For the
+same reason a word is only corrected to one that appears in at least
+MIN_CORRECTION_FREQUENCY listings (MIN_TWO_EDIT_FREQUENCY, and a word
+of MIN_TWO_EDIT_LENGTH, for two edits). Scraped data has typos of its
+own, so a known word of MIN_RARE_WORD_LENGTH or more letters is still
+corrected while it is rare: to a word at least MIN_TWO_EDIT_FREQUENCY
+and RARE_WORD_RATIO times as frequent ("clinc", 1 listing -> "clinic").
+Search keeps the matches of the query as typed first (core/search.py).
+
+Only the first PREFIX_LENGTH characters are used to build deletions
+(long words differ early if they differ at all), which keeps the index
+small. The vocabulary follows the change log (db/changes.py): each
+listing's words are replaced when it is edited and removed when it is
+deleted, so frequencies stay exact.
+"""
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional, Set
+
+from db.changes import LiveIndex
+from db.connection import read_connection
+from db.normalize import normalize_text
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_WORD_LENGTH = 3         # shorter words are never corrected
+# Listings a word must appear in to be the target of a correction
+MIN_CORRECTION_FREQUENCY = 10
+MIN_TWO_EDIT_FREQUENCY = 100
+# Shorter words are corrected by one edit at most ("watch" is two from "with")
+MIN_TWO_EDIT_LENGTH = 8
+# A known word below MIN_CORRECTION_FREQUENCY is corrected only to a word
+# this many times as frequent, and only if it has this many letters
+RARE_WORD_RATIO = 10
+MIN_RARE_WORD_LENGTH = 5
+
+# Query words left alone even though listings rarely contain them
+PROTECTED_WORDS = {
+    "best", "top", "near", "in", "for", "the", "of", "at", "and",
+    "good", "great", "cheap", "open", "now", "me",
+}
+
+VOCABULARY_FIELDS = ["category_norm", "subcategory_norm", "city_norm", "area_norm"]
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    """All strings obtained by removing up to `max_distance` characters."""
+    out = {word}
+    for d in range(1, min(max_distance, len(word) - 1) + 1):
+        for positions in combinations(range(len(word)), d):
+            out.add("".join(ch for i, ch in enumerate(word) if i not in positions))
+    return out
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance; anything above `limit` -> limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                prev2 is not None and i > 1 and j > 1
+                and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]
+            ):
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class SpellChecker:
+    """Deletion dictionary over a word -> frequency vocabulary."""
+
+    def __init__(self, max_distance: int = MAX_EDIT_DISTANCE, prefix_length: int = PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words: Counter = Counter()
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)
+        self._listing_words: Dict[int, List[str]] = {}
+
+    def _add_word(self, word: str) -> None:
+        if word not in self.words:
+            for d in _deletes(word[:self.prefix_length], self.max_distance):
+                self._deletes[d].add(word)
+        self.words[word] += 1
+
+    def _remove_word(self, word: str) -> None:
+        self.words[word] -= 1
+        if self.words[word] > 0:
+            return
+        del self.words[word]
+        for d in _deletes(word[:self.prefix_length], self.max_distance):
+            self._deletes[d].discard(word)
+            if not self._deletes[d]:
+                del self._deletes[d]
+
+    def set_listing(self, listing_id: int, texts: Iterable[Optional[str]]) -> None:
+        """Count the words of a listing's `texts`, replacing its previous words."""
+        self.remove_listing(listing_id)
+        words = [
+            word
+            for text in texts
+            for word in (text or "").split()
+            if len(word) >= MIN_WORD_LENGTH and not word.isdigit()
+        ]
+        self._listing_words[listing_id] = words
+        for word in words:
+            self._add_word(word)
+
+    def remove_listing(self, listing_id: int) -> None:
+        for word in self._listing_words.pop(listing_id, []):
+            self._remove_word(word)
+
+    def _max_distance(self, word: str) -> int:
+        return 1 if len(word) < MIN_TWO_EDIT_LENGTH else self.max_distance
+
+    def lookup(self, word: str) -> str:
+        """Closest common word (fewest edits, then most frequent), else `word`."""
+        frequency = self.words.get(word, 0)
+        if (
+            frequency >= MIN_CORRECTION_FREQUENCY
+            or word in PROTECTED_WORDS
+            or len(word) < MIN_WORD_LENGTH
+            or word.isdigit()
+        ):
+            return word
+        if frequency and (len(word) < MIN_RARE_WORD_LENGTH or any(ch.isdigit() for ch in word)):
+            # rare but known: short words and codes are left as they are
+            return word
+
+        limit = self._max_distance(word)
+        candidates = set()
+        for d in _deletes(word[:self.prefix_length], limit):
+            candidates |= self._deletes.get(d, set())
+
+        best, best_key = word, None
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, limit)
+            if distance > limit:
+                continue
+            min_frequency = MIN_CORRECTION_FREQUENCY if distance <= 1 else MIN_TWO_EDIT_FREQUENCY
+            if frequency:
+                min_frequency = max(MIN_TWO_EDIT_FREQUENCY, frequency * RARE_WORD_RATIO)
+            if candidate == word or self.words[candidate] < min_frequency:
+                continue
+            key = (distance, -self.words[candidate], candidate)
+            if best_key is None or key < best_key:
+                best, best_key = candidate, key
+        return best
+
+    def correct(self, text: str) -> str:
+        return " ".join(self.lookup(w) for w in normalize_text(text).split())
+
+
+# ============================================================
+# Loading (lazy, once per process) + change-log updates
+# ============================================================
+def _build() -> SpellChecker:
+    checker = SpellChecker()
+    with read_connection() as conn:
+        for r in conn.execute(
+            f"SELECT id, {', '.join(VOCABULARY_FIELDS)} FROM google_maps_listings"
+        ):
+            checker.set_listing(r["id"], (r[field] for field in VOCABULARY_FIELDS))
+    return checker
+
+
+def _update(checker: SpellChecker, rows, deleted) -> None:
+    for listing_id in deleted:
+        checker.remove_listing(listing_id)
+    for r in rows:
+        checker.set_listing(r["id"], (r[field] for field in VOCABULARY_FIELDS))
+
+
+_checker = LiveIndex(_build, _update, ["id"] + VOCABULARY_FIELDS)
+
+
+def get_spell_checker() -> SpellChecker:
+    return _checker.get()
+
+
+def correct_query(query: str) -> str:
+    """Normalized query with unknown words replaced by their closest match."""
+    return get_spell_checker().correct(query)
@@ -1,51 +1,165 @@
+from typing import List, Optional
+
+from core.gazetteer import extract_entities
+from db.geo import NEAR_RADIUS_KM, radius_clause
+from db.normalize import normalize_text
+from db.search_index import (
+    FTS_TABLE,
+    bm25_expression,
+    build_match_expression,
+    build_phrase_expression,
+)
+
+# Max candidate rows handed to rank_results. rank_results streams them
+# through a bounded top-k heap, so this can be much larger than top_n.
+# Candidates arrive strongest-first by the precomputed rank_prefilter
+# (db/derived.py), so the cap drops the weakest matches, not random ones.
+CANDIDATE_LIMIT = 1000
+
+
 def extract_city(query: str):
+    # fallback for places the gazetteer does not know
     q = query.lower()
     if " in " in q:
         return q.split(" in ")[-1].strip()
     return None
 
 
-def generate_sql(query: str) -> str:
-    q = query.lower()
-    city = extract_city(q)
+# Words that may surround "<category> in <city>" without changing it
+RANKING_WORDS = {"best", "top", "the", "good", "great", "in", "near", "at"}
+
+
+def parse_category_city(query: str):
+    """
+    'Best Dentists in Vadodara' / 'dentist vadodara' -> ('dentist', 'vadodara')
+    when the query is just a known category and a known city (see
+    core/gazetteer.py); None otherwise.
+    """
+    entities = extract_entities(query)
+    if not entities["category"] or not entities["city"]:
+        return None
+    if entities["near"]:
+        # ranked by distance, which the board does not know
+        return None
+    if entities["area"] or entities["state"]:
+        # boards are keyed by city only; narrower / other places are
+        # filtered on the deep path (parse_query)
+        return None
+
+    category_words = entities["category_text"].split()
+    rest = list(entities["terms"])
+    for w in category_words:
+        rest.remove(w)
+    if any(w not in RANKING_WORDS for w in rest):
+        return None
+
+    return entities["category"], entities["city"]
+
+
+def sql_literal(value: str) -> str:
+    """Quote a value as a SQLite string literal."""
+    return "'" + str(value).replace("'", "''") + "'"
+
 
-    stop_words = {
-        "best", "top", "near", "in", "for",
-        "the", "of", "business", "businesses",
-        "service", "services"
-    }
+STOP_WORDS = {
+    "best", "top", "near", "in", "for",
+    "the", "of", "business", "businesses",
+    "service", "services"
+}
+
+
+def parse_query(query: str):
+    """
+    Split a query into search keywords, SQL filter predicates and a
+    search origin.
+
+    Known cities / areas / states become equality filters on the *_norm
+    columns; their words are not keywords. "near <place>" with a known
+    centre also admits listings within NEAR_RADIUS_KM of it (an R*Tree
+    lookup, db/geo.py) and returns that centre as the (lat, lon) origin
+    for distance ranking; otherwise the origin is None.
+    """
+    # same normalization as the *_norm columns (db/derived.py)
+    q = normalize_text(query)
+
+    entities = extract_entities(q)
+    city = entities["city"]
+    if not (city or entities["area"] or entities["state"]):
+        city = extract_city(q)
 
     keywords = [
-        w for w in q.split()
+        w for w in entities["terms"]
         if len(w) > 2
-        and w not in stop_words
+        and w not in STOP_WORDS
         and w != city
     ]
 
-    if not keywords:
-        keywords = [q]
+    origin = entities["center"] if entities["near"] else None
+    nearby = radius_clause(*origin, NEAR_RADIUS_KM) if origin else None
+
+    filters = []
+    places = [("city", city), ("area", entities["area"]), ("state", entities["state"])]
+    for field, value in places:
+        if not value:
+            continue
+        predicate = f"l.{field}_norm = {sql_literal(value)}"
+        if nearby and field != "state":
+            predicate = f"({predicate} OR {nearby})"
+        filters.append(predicate)
+    filters.append("l.is_permanently_closed IS NOT 1")
+
+    return keywords, filters, origin
 
-    service_conditions = []
-    for k in keywords:
-        service_conditions.append(
-            f"""
-            LOWER(name) LIKE '%{k}%'
-            OR LOWER(category) LIKE '%{k}%'
-            OR LOWER(subcategory) LIKE '%{k}%'
-            """
-        )
 
-    service_clause = " OR ".join(service_conditions)
+def generate_sql(query: str) -> Optional[str]:
+    """
+    Candidate SQL for a query, or None when it has no searchable term
+    (every word shorter than two characters) and so cannot match.
+    """
+    keywords, filters, _ = parse_query(query)
+    where = "\n      AND ".join(filters)
+
+    if not keywords and len(filters) > 1:
+        # place only ("restaurants near kotla bazaar" minus stop words):
+        # indexed equality lookup, strongest listings first
+        return f"""
+    SELECT l.*
+    FROM google_maps_listings l
+    WHERE {where}
+    ORDER BY l.rank_prefilter DESC
+    LIMIT {CANDIDATE_LIMIT}
+    """.strip()
+
+    # Keywords are matched through the FTS5 index instead of
+    # LOWER(col) LIKE '%k%' scans over the whole table. A query made only
+    # of stop words ("best services") must match as a whole phrase, not
+    # as any of its common words.
+    if keywords:
+        match = build_match_expression(keywords)
+    else:
+        match = build_phrase_expression(query)
+    if not match:
+        # MATCH '' is an FTS5 syntax error
+        return None
+
+    return f"""
+    SELECT l.*
+    FROM {FTS_TABLE}
+    JOIN google_maps_listings l ON l.id = {FTS_TABLE}.rowid
+    WHERE {FTS_TABLE} MATCH {sql_literal(match)}
+      AND {where}
+    ORDER BY l.rank_prefilter DESC, {bm25_expression()}
+    LIMIT {CANDIDATE_LIMIT}
+    """.strip()
 
-    city_clause = ""
-    if city:
-        city_clause = f"AND LOWER(city) = '{city}'"
 
+def generate_ids_sql(ids: List[int], filters: List[str]) -> str:
+    """Listings with the given ids that pass the query's filters (see parse_query)."""
+    id_list = ", ".join(str(int(i)) for i in ids) or "NULL"
+    where = "\n      AND ".join(filters)
     return f"""
-    SELECT DISTINCT *
-    FROM google_maps_listings
-    WHERE ({service_clause})
-      {city_clause}
-      AND LOWER(name || ' ' || IFNULL(address,'')) NOT LIKE '%permanently closed%'
-    LIMIT 200
+    SELECT l.*
+    FROM google_maps_listings l
+    WHERE l.id IN ({id_list})
+      AND {where}
     """.strip()
@@ -0,0 +1,202 @@
+# db/bulk_load.py
+"""
+Streaming bulk loader for scraped listing CSVs (e.g. google_maps_listings.csv).
+
+    python -m db.bulk_load google_maps_listings.csv
+    python -m db.bulk_load new_listings.csv --chunk-size 50000
+
+The CSV is read in chunks; every row is normalized, gets its derived
+columns and identity fingerprint computed in Python, and is written with
+one executemany INSERT per chunk, each chunk in its own write transaction.
+Duplicates (within the file or against existing data) are skipped by the
+UNIQUE fingerprint index (ON CONFLICT DO NOTHING) instead of a scan.
+"""
+import argparse
+import csv
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from db.connection import read_connection, write_transaction
+from db.derived import DERIVED_COLUMNS, compute_derived
+from db.geo import report_unresolved
+from db.normalize import listing_fingerprint
+from db.query_cache import bump_generation
+
+DEFAULT_CHUNK_SIZE = 20000
+
+TEXT_FIELDS = [
+    "name",
+    "address",
+    "website",
+    "phone_number",
+    "category",
+    "subcategory",
+    "city",
+    "state",
+    "area",
+]
+
+INSERT_COLUMNS = (
+    TEXT_FIELDS
+    + ["reviews_count", "reviews_average", "created_at", "owner_email"]
+    + list(DERIVED_COLUMNS)
+    + ["fingerprint"]
+)
+
+
+# ============================================================
+# Row normalization
+# ============================================================
+def _text(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(float(str(value).replace(",", "").strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value) -> Optional[float]:
+    try:
+        return float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_row(raw: Dict, default_created_at: str, owner_email: Optional[str]) -> Optional[Dict]:
+    """Clean one CSV record; rows without a name are rejected (None)."""
+    row = {f: _text(raw.get(f)) for f in TEXT_FIELDS}
+    if not row["name"]:
+        return None
+
+    row["reviews_count"] = _int(raw.get("reviews_count"))
+    row["reviews_average"] = _float(raw.get("reviews_average"))
+    row["created_at"] = _text(raw.get("created_at")) or default_created_at
+    row["owner_email"] = _text(raw.get("owner_email")) or owner_email
+    row["fingerprint"] = listing_fingerprint(
+        row["name"], row["address"], row["area"],
+        row["city"], row["state"], row["phone_number"],
+    )
+    return row
+
+
+def iter_chunks(path: str, chunk_size: int) -> Iterator[List[Dict]]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        chunk = []
+        for record in csv.DictReader(f):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+# ============================================================
+# Loader
+# ============================================================
+def load_csv(
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    owner_email: Optional[str] = None,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Load a listings CSV into google_maps_listings.
+
+    Returns stats: rows read, inserted, duplicates skipped, invalid rows
+    rejected, elapsed seconds and rows/second. `progress` is called with
+    the running stats after every chunk.
+    """
+    created_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    placeholders = ", ".join("?" for _ in INSERT_COLUMNS)
+    sql = f"""
+        INSERT INTO google_maps_listings ({", ".join(INSERT_COLUMNS)})
+        VALUES ({placeholders})
+        ON CONFLICT(fingerprint) DO NOTHING
+    """
+
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0}
+    started = time.perf_counter()
+
+    for raw_chunk in iter_chunks(path, chunk_size):
+        rows = []
+        for raw in raw_chunk:
+            row = normalize_row(raw, created_at, owner_email)
+            if row is None:
+                stats["invalid"] += 1
+            else:
+                rows.append(row)
+
+        stats["read"] += len(raw_chunk)
+        if rows:
+            params = [
+                tuple(row[c] for c in TEXT_FIELDS)
+                + (row["reviews_count"], row["reviews_average"], row["created_at"], row["owner_email"])
+                + derived
+                + (row["fingerprint"],)
+                for row, derived in zip(rows, compute_derived(rows))
+            ]
+
+            with write_transaction() as conn:
+                inserted = conn.executemany(sql, params).rowcount
+
+            stats["inserted"] += inserted
+            stats["duplicates"] += len(rows) - inserted
+
+        elapsed = time.perf_counter() - started
+        stats["seconds"] = round(elapsed, 2)
+        stats["rows_per_sec"] = int(stats["read"] / elapsed) if elapsed else 0
+        if progress:
+            progress(dict(stats))
+
+    stats.setdefault("seconds", 0.0)
+    stats.setdefault("rows_per_sec", 0)
+
+    if stats["inserted"]:
+        bump_generation()
+
+    return stats
+
+
+def _print_progress(stats: Dict) -> None:
+    print(
+        f"read {stats['read']:,} | inserted {stats['inserted']:,} | "
+        f"duplicates {stats['duplicates']:,} | invalid {stats['invalid']:,} | "
+        f"{stats['rows_per_sec']:,} rows/s",
+        file=sys.stderr,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Bulk load listings from a CSV file.")
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--owner-email", default=None)
+    args = parser.parse_args(argv)
+
+    stats = load_csv(
+        args.csv_path,
+        chunk_size=args.chunk_size,
+        owner_email=args.owner_email,
+        progress=_print_progress,
+    )
+    print(
+        f"Done: {stats['inserted']:,} inserted, {stats['duplicates']:,} duplicates skipped, "
+        f"{stats['invalid']:,} invalid, {stats['seconds']}s ({stats['rows_per_sec']:,} rows/s)"
+    )
+
+    # new cities need a reference point before their Plus Codes resolve
+    with read_connection() as conn:
+        report_unresolved(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# db/changes.py
+"""
+Append-only change log for google_maps_listings.
+
+Triggers (migration 8, db/migrations.py) write one row to listing_changes for every INSERT, DELETE and
+UPDATE of a source column, whoever makes the write (add_business,
+update_business, bulk loads, ad-hoc SQL). Derived structures (query
+caches, leaderboards, in-memory indexes) read the log incrementally:
+
+    feed = ChangeFeed()            # starts at the current end of the log
+    ...
+    for change in feed.poll():     # only what happened since last poll
+        ...
+
+Each change carries the listing id, the operation, and for updates and
+deletes the previous city / category / subcategory, so consumers can
+also fix up entries a listing moved away from.
+
+LiveIndex wraps the usual consumer: a lazily built in-memory structure
+(gazetteer, spell checker, autocomplete trie) updated from a ChangeFeed.
+"""
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from db.connection import read_connection, write_transaction
+from db.query_cache import current_generation
+from db.rows import fetch_rows_by_ids
+
+CHANGES_TABLE = "listing_changes"
+
+# How stale cached_latest_seq() may be for writes made by other processes
+HEAD_POLL_SECONDS = 1.0
+
+
+def latest_seq(conn: Optional[sqlite3.Connection] = None) -> int:
+    """
+    Sequence number of the newest change (0 if nothing was ever logged).
+    Read from sqlite_sequence, which AUTOINCREMENT never rewinds, so the
+    head keeps growing even after prune_changes empties the table.
+    Pass `conn` to read it inside an open transaction.
+    """
+    if conn is None:
+        with read_connection() as conn:
+            return latest_seq(conn)
+
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name = ?", (CHANGES_TABLE,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+_head_lock = threading.Lock()
+_head = {"seq": 0, "read_at": float("-inf"), "generation": None}
+
+
+def cached_latest_seq(max_age: float = HEAD_POLL_SECONDS) -> int:
+    """
+    latest_seq() without a query on every call: re-read at most every
+    `max_age` seconds, and right after any write made by this process
+    (bump_generation, db/query_cache.py). Hot paths such as the search
+    cache check use it.
+    """
+    generation = current_generation()
+    now = time.monotonic()
+    with _head_lock:
+        if now - _head["read_at"] < max_age and _head["generation"] == generation:
+            return _head["seq"]
+
+    seq = latest_seq()
+    with _head_lock:
+        _head.update(seq=seq, read_at=now, generation=generation)
+    return seq
+
+
+def changes_since(seq: int, limit: int = 10000) -> List[Dict]:
+    """Changes with seq > `seq`, oldest first, at most `limit` of them."""
+    with read_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT seq, listing_id, op, old_city, old_category, old_subcategory, changed_at
+            FROM {CHANGES_TABLE}
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+            """,
+            (seq, limit),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def prune_changes(before_seq: int) -> int:
+    """Drop log entries every consumer has already seen."""
+    with write_transaction() as conn:
+        return conn.execute(
+            f"DELETE FROM {CHANGES_TABLE} WHERE seq < ?", (before_seq,)
+        ).rowcount
+
+
+class ChangeFeed:
+    """
+    Cursor over the change log for one consumer.
+
+    `start` is the last sequence number already reflected by the
+    consumer; by default the feed starts at the current end of the log,
+    i.e. the consumer has just been built from a full snapshot.
+    """
+
+    def __init__(self, start: Optional[int] = None):
+        self.seq = latest_seq() if start is None else start
+
+    def poll(self, limit: int = 10000) -> List[Dict]:
+        """All changes since the previous poll (oldest first)."""
+        changes = []
+        while True:
+            batch = changes_since(self.seq, limit)
+            if not batch:
+                return changes
+            changes.extend(batch)
+            self.seq = batch[-1]["seq"]
+            if len(batch) < limit:
+                return changes
+
+    def changed_ids(self) -> Dict[str, set]:
+        """
+        Poll and collapse the changes to listing ids:
+        {"upserted": ids that exist now, "deleted": ids that were removed}.
+        """
+        upserted, deleted = set(), set()
+        for change in self.poll():
+            if change["op"] == "delete":
+                upserted.discard(change["listing_id"])
+                deleted.add(change["listing_id"])
+            else:
+                deleted.discard(change["listing_id"])
+                upserted.add(change["listing_id"])
+        return {"upserted": upserted, "deleted": deleted}
+
+
+class LiveIndex:
+    """
+    An in-memory structure built from the listings once per process, on
+    first use, and then kept current from the change log.
+
+        _index = LiveIndex(build, update, columns)
+        value = _index.get()
+
+    build() returns the structure from a full read. On later get() calls
+    the changes since the previous call are applied with
+    update(value, rows, deleted_ids), where `rows` are the current
+    `columns` of every inserted or updated listing. Calls are serialized,
+    so build / update need no locking of their own.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], Any],
+        update: Callable[[Any, List[sqlite3.Row], Set[int]], None],
+        columns: Sequence[str],
+    ):
+        self._build = build
+        self._update = update
+        self._columns = list(columns)
+        self._value = None
+        self._feed: Optional[ChangeFeed] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        with self._lock:
+            if self._value is None:
+                # feed first: changes made while building are replayed later
+                self._feed = ChangeFeed()
+                self._value = self._build()
+                return self._value
+
+            changed = self._feed.changed_ids()
+            if changed["upserted"] or changed["deleted"]:
+                rows = []
+                if changed["upserted"]:
+                    with read_connection() as conn:
+                        rows = list(fetch_rows_by_ids(conn, changed["upserted"], self._columns))
+                self._update(self._value, rows, changed["deleted"])
+            return self._value
+
+    def reset(self) -> None:
+        """Drop the structure; the next get() rebuilds it."""
+        with self._lock:
+            self._value, self._feed = None, None
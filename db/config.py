@@ -1 +1,28 @@
 DB_PATH = "db/businesses.db"
+
+# Connection manager (db/connection.py)
+READ_POOL_SIZE = 8            # idle read connections kept open
+STATEMENT_CACHE_SIZE = 256    # prepared statements cached per connection
+BUSY_TIMEOUT_MS = 5000
+
+# Apply pending schema migrations on the first connection instead of
+# failing. Migrations can rewrite every row while holding the writer
+# lock, so production runs `python -m db.migrations` at deploy time.
+AUTO_MIGRATE = False
+
+SQLITE_PRAGMAS = {
+    "synchronous": "NORMAL",      # safe with WAL, one fsync per checkpoint
+    "mmap_size": 268435456,       # 256 MB memory-mapped reads
+    "cache_size": -65536,         # 64 MB page cache per connection
+    "temp_store": "MEMORY",
+}
+
+# Offline semantic index (db/semantic_index.py), built with
+# `python -m db.semantic_index`
+SEMANTIC_INDEX_DIR = "db/vectors"
+
+# Town centres used to resolve short Plus Codes (db/geo.py)
+CITY_REFERENCE_POINTS_PATH = "db/city_reference_points.csv"
+
+# Chat answer cache (llm/response_cache.py), kept out of the listings DB
+LLM_CACHE_PATH = "db/llm_cache.db"
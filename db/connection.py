@@ -0,0 +1,170 @@
+# db/connection.py
+"""
+Long-lived SQLite connections shared by every DB access path.
+
+- Readers borrow a connection from a small pool (one per concurrently
+  running thread) and give it back when done, so Streamlit reruns never
+  pay for connect / schema parse / cold page cache.
+- All writes go through ONE writer connection guarded by a lock, which
+  matches SQLite's single-writer model and avoids "database is locked".
+- The database runs in WAL mode so readers never block the writer.
+
+Statements are cached per connection (STATEMENT_CACHE_SIZE), so any
+query issued with a constant SQL text and `?` parameters is prepared
+only once per connection.
+"""
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from db.config import (
+    AUTO_MIGRATE,
+    BUSY_TIMEOUT_MS,
+    DB_PATH,
+    READ_POOL_SIZE,
+    SQLITE_PRAGMAS,
+    STATEMENT_CACHE_SIZE,
+)
+from db.migrations import SCHEMA_VERSION, get_schema_version, run_migrations
+
+_READ_POOL: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=READ_POOL_SIZE)
+
+_WRITE_LOCK = threading.RLock()
+_writer: sqlite3.Connection | None = None
+
+_INIT_LOCK = threading.Lock()
+_initialized = False
+
+
+class SchemaOutdatedError(RuntimeError):
+    """The database needs `python -m db.migrations` before it can be served."""
+
+
+# ============================================================
+# Connection setup
+# ============================================================
+def _connect(read_only: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        isolation_level=None,       # transactions are explicit
+    )
+    conn.row_factory = sqlite3.Row
+
+    for name, value in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    conn.execute(f"PRAGMA busy_timeout = {int(BUSY_TIMEOUT_MS)}")
+
+    if read_only:
+        conn.execute("PRAGMA query_only = 1")
+
+    return conn
+
+
+def _get_writer() -> sqlite3.Connection:
+    global _writer
+    if _writer is None:
+        _writer = _connect(read_only=False)
+        _writer.execute("PRAGMA journal_mode = WAL")
+    return _writer
+
+
+def init_db() -> None:
+    """
+    Switch to WAL and check the schema version (once per process).
+    Pending migrations are applied only with AUTO_MIGRATE; otherwise
+    they are a deploy step (`python -m db.migrations`).
+    """
+    global _initialized
+    if _initialized:
+        return
+
+    with _INIT_LOCK:
+        if _initialized:
+            return
+        with _WRITE_LOCK:
+            writer = _get_writer()
+            version = get_schema_version(writer)
+            if version < SCHEMA_VERSION:
+                if not AUTO_MIGRATE:
+                    raise SchemaOutdatedError(
+                        f"Database schema is at version {version}, expected "
+                        f"{SCHEMA_VERSION}: run `python -m db.migrations`"
+                    )
+                run_migrations(writer)
+        _initialized = True
+
+
+# ============================================================
+# Public API
+# ============================================================
+@contextmanager
+def read_connection() -> Iterator[sqlite3.Connection]:
+    """
+    Borrow a pooled read-only connection:
+
+        with read_connection() as conn:
+            rows = conn.execute("SELECT ...", params).fetchall()
+    """
+    init_db()
+
+    try:
+        conn = _READ_POOL.get_nowait()
+    except queue.Empty:
+        conn = _connect(read_only=True)
+
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _READ_POOL.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+@contextmanager
+def write_transaction() -> Iterator[sqlite3.Connection]:
+    """
+    Run a block of writes on the shared writer connection inside one
+    IMMEDIATE transaction. Commits on success, rolls back on error.
+    Nested calls from the same thread join the outer transaction.
+    """
+    init_db()
+
+    with _WRITE_LOCK:
+        conn = _get_writer()
+        if conn.in_transaction:
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+
+def close_all() -> None:
+    """Close every pooled connection (tests / shutdown)."""
+    global _writer, _initialized
+
+    while True:
+        try:
+            _READ_POOL.get_nowait().close()
+        except queue.Empty:
+            break
+
+    with _WRITE_LOCK:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+        _initialized = False
@@ -1,11 +1,25 @@
 # db/db.py
-import sqlite3
-import math
-import re
+import heapq
 from datetime import datetime
-from typing import List, Dict
-
-from db.config import DB_PATH
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from db.connection import read_connection
+from db.geo import NEAR_RADIUS_KM, haversine_km
+from db.normalize import normalize_text
+from db.search_index import (
+    TRIGRAM_TABLE,
+    build_trigram_match,
+    trigram_similarity,
+    trigrams,
+)
+from ranking.batch_ranker import (
+    INFO_FIELDS,
+    predict_scores,
+    ranking_order,
+    score_batch,
+)
 from ranking.ml_ranker import load_ranker
 
 
@@ -14,35 +28,94 @@ from ranking.ml_ranker import load_ranker
 # ============================================================
 ML_MODEL = load_ranker()
 
-
-# ============================================================
-# Configuration
-# ============================================================
-INFO_FIELDS = [
-    "website",
-    "phone_number",
-    "address",
-    "category",
-    "subcategory",
-    "city",
-    "state",
-]
+# Added to a listing's score at the search origin, falling linearly to 0
+# at NEAR_RADIUS_KM ("near <place>" queries only)
+PROXIMITY_BOOST = 1.0
 
 
 # ============================================================
 # Database Access
 # ============================================================
-def run_sql(sql: str) -> List[Dict]:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
+def iter_sql(sql: str, params=(), batch_size: int = 256) -> Iterator[Dict]:
+    """
+    Stream query results lazily from the cursor instead of materializing
+    every row. The pooled connection is returned once the generator is
+    exhausted or closed.
+    """
+    with read_connection() as conn:
+        cur = conn.execute(sql, params)
+        while True:
+            chunk = cur.fetchmany(batch_size)
+            if not chunk:
+                break
+            for r in chunk:
+                yield dict(r)
+
+
+# Rows pulled from the trigram posting lists before similarity ranking
+TRIGRAM_CANDIDATES = 300
+
+
+def trigram_search(
+    text: str,
+    column: str = "name_norm",
+    limit: int = 20,
+    min_similarity: float = 0.5,
+    owner_email: str | None = None,
+    filters: Iterable[str] = (),
+) -> List[Dict]:
+    """
+    Substring / fuzzy lookup on name_norm or address_norm through the
+    trigram index ("sai dent", "dental clnic").
+
+    `filters` are extra SQL predicates on the listing `l` (the place
+    filters of core/text_to_sql.parse_query), applied before the
+    TRIGRAM_CANDIDATES limit.
+
+    Candidates sharing trigrams with `text` come from the index (best bm25
+    first); each is then scored by trigram_similarity and kept when at
+    least `min_similarity` of the query's trigrams occur in it. Results
+    are ordered by (containment, jaccard) and carry a "similarity" key.
+    """
+    match = build_trigram_match(text, column)
+    if not match:
+        return []
+
+    sql = f"""
+        SELECT l.*
+        FROM {TRIGRAM_TABLE}
+        JOIN google_maps_listings l ON l.id = {TRIGRAM_TABLE}.rowid
+        WHERE {TRIGRAM_TABLE} MATCH ?
+    """
+    params: list = [match]
 
-    try:
-        cur.execute(sql)
-        rows = [dict(r) for r in cur.fetchall()]
-    finally:
-        conn.close()
+    if owner_email is not None:
+        sql += " AND l.owner_email = ?"
+        params.append(owner_email)
 
+    for predicate in filters:
+        sql += f" AND {predicate}"
+
+    sql += f"""
+        ORDER BY bm25({TRIGRAM_TABLE})
+        LIMIT ?
+    """
+    params.append(TRIGRAM_CANDIDATES)
+
+    query_grams = trigrams(text)
+    scored = []
+    with read_connection() as conn:
+        for r in conn.execute(sql, params):
+            containment, jaccard = trigram_similarity(query_grams, r[column])
+            if containment >= min_similarity:
+                scored.append(((containment, jaccard), dict(r)))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+
+    rows = []
+    for (containment, jaccard), r in scored[:limit]:
+        r["similarity"] = round(jaccard, 3)
+        rows.append(r)
     return rows
 
 
@@ -50,7 +123,7 @@ def run_sql(sql: str) -> List[Dict]:
 # Utilities
 # ============================================================
 def tokenize(text: str) -> set:
-    return set(re.findall(r"\w+", text.lower())) if text else set()
+    return set(normalize_text(text).split()) if text else set()
 
 
 def info_completeness_score(r: Dict) -> float:
@@ -67,10 +140,35 @@ def info_completeness_score(r: Dict) -> float:
 # ============================================================
 # Ranking Logic (Customer + Business Friendly)
 # ============================================================
+RANK_BATCH_SIZE = 256
+
+
+def _batches(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _distances(rows: List[Dict], origin: Tuple[float, float]) -> np.ndarray:
+    """km from origin per row; inf for rows without coordinates."""
+    return np.array([
+        haversine_km(*origin, r["lat"], r["lon"])
+        if r.get("lat") is not None and r.get("lon") is not None
+        else np.inf
+        for r in rows
+    ])
+
+
 def rank_results(
-    rows: List[Dict],
+    rows: Iterable[Dict],
     query: str = "",
-    top_n: int = 10
+    top_n: int = 10,
+    origin: Optional[Tuple[float, float]] = None,
 ) -> List[Dict]:
     """
     Unified ranking logic:
@@ -86,133 +184,119 @@ def rank_results(
 
     OPTIONAL:
     - ML ranker if available (safe fallback)
+    - Proximity boost when an origin (lat, lon) is given
+
+    `rows` may be any iterable (e.g. iter_sql). Candidates are scored in
+    batches of RANK_BATCH_SIZE and only the best `top_n` are kept in a
+    bounded heap, so memory and sort cost scale with top_n rather than
+    with the number of candidates.
     """
+    if top_n <= 0:
+        return []
 
     now = datetime.utcnow()
-    ranked = []
     seen = set()
     query_tokens = tokenize(query)
 
-    # ------------------------------
-    # Feature extraction
-    # ------------------------------
-    for r in rows:
-        # -------- remove permanently closed --------
-        text = f"{r.get('name','')} {r.get('address','')}".lower()
-        if "permanently closed" in text:
-            continue
-
-        # -------- deduplicate --------
-        dedup_key = (
-            (r.get("name") or "").lower().strip(),
-            (r.get("address") or "").lower().strip()
-        )
-        if dedup_key in seen:
-            continue
-        seen.add(dedup_key)
-
-        # -------- base values --------
-        rating = r.get("reviews_average")
-        reviews = r.get("reviews_count") or 0
-
-        # Neutral default for local businesses
-        if rating is None:
-            rating = 3.5
-
-        # =====================================================
-        # REQUIRED CORE FORMULA (YOU ASKED FOR THIS)
-        # =====================================================
-        base_score = rating * 0.75 + reviews * 0.002
-
-        # -------- info completeness boost --------
-        info_ratio = info_completeness_score(r)
-        info_boost = info_ratio * 0.5   # safe, non-dominant
-
-        # -------- freshness boost --------
-        freshness_boost = 0.0
-        try:
-            created = datetime.fromisoformat(r.get("created_at"))
-            if (now - created).days <= 180:
-                freshness_boost = 0.1
-        except Exception:
-            pass
-
-        # -------- query relevance (for search) --------
-        relevance = 0.0
-        if query_tokens:
-            searchable_text = f"""
-                {r.get('name','')}
-                {r.get('category','')}
-                {r.get('subcategory','')}
-                {r.get('area','')}
-            """
-            relevance = (
-                len(tokenize(searchable_text) & query_tokens)
-                / max(len(query_tokens), 1)
+    # min-heap of the best top_n so far; heap[0] is the weakest kept row.
+    # Key: (score, info_score, rating, reviews, -seq) - the final ranking
+    # tuple, with earlier candidates winning exact ties (stable order).
+    heap = []
+    seq = 0
+
+    for chunk in _batches(rows, RANK_BATCH_SIZE):
+        # ------------------------------
+        # Filtering (closed / duplicates)
+        # ------------------------------
+        candidates = []
+        for r in chunk:
+            # -------- remove permanently closed --------
+            closed = r.get("is_permanently_closed")
+            if closed is None:
+                text = f"{r.get('name','')} {r.get('address','')}".lower()
+                closed = "permanently closed" in text
+            if closed:
+                continue
+
+            # -------- deduplicate (normalized name + address) --------
+            dedup_key = (
+                r["name_norm"] if r.get("name_norm") is not None else normalize_text(r.get("name")),
+                r["address_norm"] if r.get("address_norm") is not None else normalize_text(r.get("address")),
             )
+            if dedup_key in seen:
+                continue
+            seen.add(dedup_key)
 
-        # -------- popularity (log-scaled) --------
-        popularity = math.log1p(reviews)
-
-        # -------- ML feature vector --------
-        features = [
-            base_score,
-            info_ratio,
-            relevance,
-            popularity
-        ]
-
-        r["features"] = features
-        r["rating"] = rating
-        r["reviews"] = reviews
-        r["info_score"] = round(info_ratio, 3)
-
-        # -------- final heuristic score --------
-        r["score"] = round(
-            base_score +
-            info_boost +
-            freshness_boost +
-            relevance * 0.3,
-            3
-        )
+            candidates.append(r)
 
-        ranked.append(r)
+        if not candidates:
+            continue
 
-    if not ranked:
-        return []
+        # ------------------------------
+        # Feature extraction (vectorized, see ranking/batch_ranker.py)
+        #   base_score = rating * 0.75 + reviews * 0.002
+        #   score      = base_score + info * 0.5 + freshness + relevance * 0.3
+        # ------------------------------
+        batch = score_batch(candidates, query_tokens, now)
+
+        scores = np.round(batch["score"], 3)
+        info_scores = np.round(batch["info_ratio"], 3)
+
+        # ------------------------------
+        # ML scoring (optional, safe)
+        # ------------------------------
+        if ML_MODEL:
+            ml_scores = predict_scores(ML_MODEL, batch["features"])
+            if ml_scores is not None:
+                scores = np.asarray(ml_scores, dtype=np.float64)
+
+        # ------------------------------
+        # Proximity (on top of either scorer)
+        # ------------------------------
+        if origin is not None:
+            closeness = np.clip(1.0 - _distances(candidates, origin) / NEAR_RADIUS_KM, 0.0, 1.0)
+            scores = np.round(scores + PROXIMITY_BOOST * closeness, 3)
+
+        # ------------------------------
+        # Bounded top-k selection
+        # Visit the chunk best-first; stop once a row cannot enter the heap.
+        # ------------------------------
+        order = ranking_order(scores, info_scores, batch["rating"], batch["reviews"])
+
+        for i in order[:top_n].tolist():
+            key = (
+                float(scores[i]),
+                float(info_scores[i]),
+                float(batch["rating"][i]),
+                float(batch["reviews"][i]),
+                -(seq + i),
+            )
+            item = (key, candidates[i], batch["features"][i])
 
-    # ------------------------------
-    # ML scoring (optional, safe)
-    # ------------------------------
-    if ML_MODEL:
-        X = [r["features"] for r in ranked]
-
-        try:
-            scores = ML_MODEL.predict(X)
-        except ValueError:
-            # feature mismatch protection
-            expected = getattr(ML_MODEL, "n_features_in_", None)
-            if expected:
-                X_fixed = [x[:expected] for x in X]
-                scores = ML_MODEL.predict(X_fixed)
+            if len(heap) < top_n:
+                heapq.heappush(heap, item)
+            elif key > heap[0][0]:
+                heapq.heapreplace(heap, item)
             else:
-                scores = None
+                break
 
-        if scores is not None:
-            for r, s in zip(ranked, scores):
-                r["score"] = float(s)
+        seq += len(candidates)
 
     # ------------------------------
     # Final stable ranking
+    # (score, info_score, rating, reviews) descending
     # ------------------------------
-    ranked.sort(
-        key=lambda x: (
-            x["score"],       # overall quality
-            x["info_score"],  # better profiles win ties
-            x["rating"],      # higher stars
-            x["reviews"],     # more confidence
-        ),
-        reverse=True
-    )
+    ranked = []
+    for key, r, features in sorted(heap, key=lambda item: item[0], reverse=True):
+        rating = r.get("reviews_average")
+        r["features"] = features.tolist()
+        r["rating"] = 3.5 if rating is None else rating
+        r["reviews"] = r.get("reviews_count") or 0
+        r["info_score"] = key[1]
+        r["score"] = key[0]
+        if origin is not None:
+            distance = float(_distances([r], origin)[0])
+            r["distance_km"] = round(distance, 2) if np.isfinite(distance) else None
+        ranked.append(r)
 
-    return ranked[:top_n]
+    return ranked
@@ -0,0 +1,277 @@
+# db/derived.py
+"""
+Derived columns stored on google_maps_listings.
+
+These values depend only on the row itself, so they are computed once on
+write instead of on every search:
+
+    rank_base_score      rating * 0.75 + reviews * 0.002
+    rank_info_ratio      info completeness (0 -> 1)
+    rank_popularity      log1p(reviews)
+    is_permanently_closed
+    rank_prefilter       rank_base_score + rank_info_ratio * 0.5
+    phone_norm           canonical phone number (db/normalize.py)
+    <field>_norm         NFKC / casefolded / punctuation-free text used
+                         by search, dedup and duplicate checks
+    lat, lon             decoded from a Plus Code in area / address
+                         (db/geo.py); NULL when there is none
+    fingerprint          hash of the normalized identity fields, UNIQUE;
+                         only the lowest id of a duplicate group keeps it
+
+rank_prefilter is the query-independent part of the rank_results
+heuristic; generate_sql orders by it so SQLite hands only the strongest
+candidates to Python.
+
+The formulas come from ranking/batch_ranker.py, the same code used by
+rank_results, so stored and on-the-fly values are identical.
+
+Backfill existing rows with:
+
+    python -m db.derived
+"""
+import sqlite3
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from db.geo import locate
+from db.normalize import listing_fingerprint, normalize_phone, normalize_text
+from db.rows import fetch_rows_by_ids
+from ranking.batch_ranker import (
+    INFO_BOOST_WEIGHT,
+    base_scores,
+    closed_mask,
+    info_completeness,
+    popularity,
+    rating_and_reviews,
+)
+
+DERIVED_COLUMNS = {
+    "rank_base_score": "REAL",
+    "rank_info_ratio": "REAL",
+    "rank_popularity": "REAL",
+    "is_permanently_closed": "INTEGER",
+    "rank_prefilter": "REAL",
+    "phone_norm": "TEXT",
+}
+
+# Text columns that get a normalized <field>_norm shadow column
+NORMALIZED_TEXT_FIELDS = [
+    "name",
+    "address",
+    "category",
+    "subcategory",
+    "area",
+    "city",
+    "state",
+]
+
+for _field in NORMALIZED_TEXT_FIELDS:
+    DERIVED_COLUMNS[f"{_field}_norm"] = "TEXT"
+
+DERIVED_COLUMNS["lat"] = "REAL"
+DERIVED_COLUMNS["lon"] = "REAL"
+
+# Source columns the derived values are computed from
+SOURCE_COLUMNS = [
+    "id",
+    "name",
+    "address",
+    "website",
+    "phone_number",
+    "reviews_count",
+    "reviews_average",
+    "category",
+    "subcategory",
+    "city",
+    "state",
+    "area",
+]
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+RANKING_COLUMNS = [
+    "rank_base_score",
+    "rank_info_ratio",
+    "rank_popularity",
+    "is_permanently_closed",
+    "rank_prefilter",
+]
+
+# Every column refresh_derived can write (fingerprint is handled apart:
+# it is UNIQUE and needs the claim step in _write)
+ALL_COLUMNS = list(DERIVED_COLUMNS) + ["fingerprint"]
+
+
+def _column_values(rows: Sequence[Dict], columns: Sequence[str]) -> Dict[str, list]:
+    """column -> values per row, computing only the requested columns."""
+    wanted = set(columns)
+    values: Dict[str, list] = {}
+
+    if wanted.intersection(RANKING_COLUMNS):
+        rating, reviews = rating_and_reviews(rows)
+        base = base_scores(rating, reviews)
+        info_ratio = info_completeness(rows)
+        values["rank_base_score"] = base.tolist()
+        values["rank_info_ratio"] = info_ratio.tolist()
+        values["rank_popularity"] = popularity(reviews).tolist()
+        values["is_permanently_closed"] = closed_mask(rows).astype(int).tolist()
+        values["rank_prefilter"] = (base + info_ratio * INFO_BOOST_WEIGHT).tolist()
+
+    if "phone_norm" in wanted:
+        values["phone_norm"] = [normalize_phone(r.get("phone_number")) for r in rows]
+
+    for f in NORMALIZED_TEXT_FIELDS:
+        if f"{f}_norm" in wanted:
+            values[f"{f}_norm"] = [normalize_text(r.get(f)) for r in rows]
+
+    if wanted.intersection(("lat", "lon")):
+        coordinates = [locate(r) for r in rows]
+        values["lat"] = [c[0] for c in coordinates]
+        values["lon"] = [c[1] for c in coordinates]
+
+    return values
+
+
+def compute_derived(rows: Sequence[Dict], columns: Optional[Sequence[str]] = None) -> List[tuple]:
+    """Derived column values for each row, in `columns` (default DERIVED_COLUMNS) order."""
+    columns = list(DERIVED_COLUMNS) if columns is None else list(columns)
+    values = _column_values(rows, columns)
+    return list(zip(*(values[c] for c in columns)))
+
+
+def _write(conn: sqlite3.Connection, rows: Sequence[Dict], columns: Sequence[str]) -> int:
+    if not rows:
+        return 0
+
+    plain = [c for c in columns if c != "fingerprint"]
+    if plain:
+        # only the listed columns are SET, so triggers on other columns
+        # (FTS, trigram, geo) do not fire
+        assignments = ", ".join(f"{c} = ?" for c in plain)
+        conn.executemany(
+            f"UPDATE google_maps_listings SET {assignments} WHERE id = ?",
+            [
+                values + (r["id"],)
+                for r, values in zip(rows, compute_derived(rows, plain))
+            ],
+        )
+
+    if "fingerprint" not in columns:
+        return len(rows)
+
+    # fingerprint is UNIQUE: clear it, then claim it unless another
+    # listing already owns the same identity (that row stays unfingerprinted)
+    ids = [(r["id"],) for r in rows]
+    conn.executemany(
+        "UPDATE google_maps_listings SET fingerprint = NULL WHERE id = ?", ids
+    )
+    conn.executemany(
+        "UPDATE OR IGNORE google_maps_listings SET fingerprint = ? WHERE id = ?",
+        [
+            (
+                listing_fingerprint(
+                    r.get("name"), r.get("address"), r.get("area"),
+                    r.get("city"), r.get("state"), r.get("phone_number"),
+                ),
+                r["id"],
+            )
+            for r in rows
+        ],
+    )
+    return len(rows)
+
+
+def refresh_derived(
+    conn: sqlite3.Connection,
+    ids: Optional[Iterable[int]] = None,
+    columns: Optional[Sequence[str]] = None,
+) -> int:
+    """
+    Recompute derived columns for the given listing ids (all rows if
+    ids is None). Runs inside the caller's transaction.
+
+    `columns` limits the work to some derived columns (default: all of
+    ALL_COLUMNS); migrations backfill only the columns they add.
+    """
+    columns = ALL_COLUMNS if columns is None else list(columns)
+    cols = ", ".join(SOURCE_COLUMNS)
+    conn_factory = conn.row_factory
+    conn.row_factory = sqlite3.Row
+
+    try:
+        if ids is not None:
+            rows = [dict(r) for r in fetch_rows_by_ids(conn, ids, SOURCE_COLUMNS)]
+            return _write(conn, rows, columns)
+
+        # full backfill, walked in id order in bounded batches
+        updated = 0
+        last_id = -1
+        while True:
+            rows = [
+                dict(r) for r in conn.execute(
+                    f"""
+                    SELECT {cols} FROM google_maps_listings
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                    """,
+                    (last_id, BACKFILL_BATCH_SIZE),
+                )
+            ]
+            if not rows:
+                return updated
+            updated += _write(conn, rows, columns)
+            last_id = rows[-1]["id"]
+    finally:
+        conn.row_factory = conn_factory
+
+
+# Indexes created together with the derived column they cover
+DERIVED_INDEXES = {
+    "rank_prefilter": """
+        CREATE INDEX IF NOT EXISTS idx_listings_prefilter
+        ON google_maps_listings (rank_prefilter DESC)
+    """,
+    "phone_norm": """
+        CREATE INDEX IF NOT EXISTS idx_listings_phone_norm
+        ON google_maps_listings (phone_norm)
+    """,
+    "category_norm": """
+        CREATE INDEX IF NOT EXISTS idx_listings_city_category_norm
+        ON google_maps_listings (city_norm, category_norm)
+    """,
+    "fingerprint": """
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_listings_fingerprint
+        ON google_maps_listings (fingerprint)
+    """,
+}
+
+
+def add_derived_columns(conn: sqlite3.Connection, columns: Sequence[str]) -> None:
+    """
+    Schema step used by db/migrations.py: add `columns` (and their
+    indexes) if missing. Each migration passes the columns it
+    introduced, so its work does not grow as later columns are added.
+    """
+    existing = {r[1] for r in conn.execute('PRAGMA table_info("google_maps_listings")')}
+    for name in columns:
+        if name not in existing:
+            sql_type = DERIVED_COLUMNS.get(name, "TEXT")
+            conn.execute(f"ALTER TABLE google_maps_listings ADD COLUMN {name} {sql_type}")
+
+    for name in columns:
+        if name in DERIVED_INDEXES:
+            conn.execute(DERIVED_INDEXES[name])
+
+
+def main() -> None:
+    # imported here: db.connection -> db.migrations -> db.derived
+    from db.connection import write_transaction
+
+    with write_transaction() as conn:
+        updated = refresh_derived(conn)
+    print(f"Backfilled derived columns for {updated} listings")
+
+
+if __name__ == "__main__":
+    main()
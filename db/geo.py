@@ -0,0 +1,287 @@
+# db/geo.py
+"""
+Coordinates for listings, decoded from Google Plus Codes.
+
+Scraped area / address values often contain an Open Location Code
+(https://github.com/google/open-location-code), almost always in its
+short form ("R9P7+8RC, behind Balaji theatre"): the first four digits
+are dropped and must be recovered from a reference point within about
+half a degree. db/city_reference_points.csv supplies that point per
+city; listings in other cities, or without a code, keep NULL
+coordinates. After adding a city (e.g. one new in a bulk load), re-run
+
+    python -m db.geo
+
+which recomputes lat / lon and lists the cities whose codes still
+cannot be resolved.
+
+lat / lon are derived columns (db/derived.py). listings_geo, an R*Tree
+kept in sync by triggers, indexes them for radius searches:
+
+    box = bounding_box(lat, lon, radius_km)
+    ... WHERE id IN (SELECT id FROM listings_geo WHERE <box>)
+
+with haversine_km() distances then feeding the ranking (db/db.py).
+"""
+import csv
+import math
+import os
+import re
+import sqlite3
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from db.config import CITY_REFERENCE_POINTS_PATH
+from db.normalize import normalize_text
+
+GEO_TABLE = "listings_geo"
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Radius of a "near <place>" search
+NEAR_RADIUS_KM = 5.0
+
+# Open Location Code constants
+CODE_ALPHABET = "23456789CFGHJMPQRVWX"
+SEPARATOR = "+"
+SEPARATOR_POSITION = 8
+PAIR_RESOLUTIONS = [20.0, 1.0, 0.05, 0.0025, 0.000125]
+GRID_ROWS, GRID_COLUMNS = 5, 4
+
+PLUS_CODE_RE = re.compile(
+    r"(?<![0-9A-Z])([23456789CFGHJMPQRVWX]{4,8}\+[23456789CFGHJMPQRVWX]{2,3})(?![0-9A-Z])"
+)
+
+
+def load_reference_points(path: str = CITY_REFERENCE_POINTS_PATH) -> Dict[str, Tuple[float, float]]:
+    """
+    Approximate town centres (normalized city -> lat, lon) from a
+    city,lat,lon CSV. Short codes only need a reference within ~50 km,
+    so town-level points are enough.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {
+            normalize_text(r["city"]): (float(r["lat"]), float(r["lon"]))
+            for r in csv.DictReader(f)
+        }
+
+
+CITY_REFERENCE_POINTS: Dict[str, Tuple[float, float]] = load_reference_points()
+
+
+# ============================================================
+# Open Location Code
+# ============================================================
+def _digit(ch: str) -> int:
+    return CODE_ALPHABET.index(ch)
+
+
+def decode(code: str) -> Tuple[float, float]:
+    """Centre (lat, lon) of a full Plus Code such as '7J4VR9P7+8RC'."""
+    digits = code.upper().replace(SEPARATOR, "")
+    lat, lon = -90.0, -180.0
+    lat_size = lon_size = PAIR_RESOLUTIONS[0]
+
+    for i, resolution in enumerate(PAIR_RESOLUTIONS):
+        if 2 * i + 1 >= len(digits):
+            break
+        lat += _digit(digits[2 * i]) * resolution
+        lon += _digit(digits[2 * i + 1]) * resolution
+        lat_size = lon_size = resolution
+
+    # grid refinement digits (11th onwards)
+    for ch in digits[10:]:
+        lat_size /= GRID_ROWS
+        lon_size /= GRID_COLUMNS
+        row, col = divmod(_digit(ch), GRID_COLUMNS)
+        lat += row * lat_size
+        lon += col * lon_size
+
+    return lat + lat_size / 2, lon + lon_size / 2
+
+
+def encode_prefix(lat: float, lon: float, length: int) -> str:
+    """The first `length` (even, <= 10) digits of the code for a point."""
+    lat = min(max(lat, -90.0), 90.0 - 1e-9) + 90.0
+    lon = (lon + 180.0) % 360.0
+    out = []
+    for resolution in PAIR_RESOLUTIONS[:length // 2]:
+        d_lat, d_lon = int(lat // resolution), int(lon // resolution)
+        out += [CODE_ALPHABET[d_lat], CODE_ALPHABET[d_lon]]
+        lat -= d_lat * resolution
+        lon -= d_lon * resolution
+    return "".join(out)
+
+
+def recover_nearest(short_code: str, ref_lat: float, ref_lon: float) -> Tuple[float, float]:
+    """
+    Full-code centre of a short code, choosing the candidate nearest to the
+    reference point (the reference algorithm's recoverNearest).
+    """
+    short_code = short_code.upper()
+    padding = SEPARATOR_POSITION - short_code.index(SEPARATOR)
+    if padding <= 0:
+        return decode(short_code)
+
+    resolution = 20.0 ** (2 - padding / 2)
+    half = resolution / 2
+    lat, lon = decode(encode_prefix(ref_lat, ref_lon, padding) + short_code)
+
+    if ref_lat + half < lat and lat - resolution >= -90:
+        lat -= resolution
+    elif ref_lat - half > lat and lat + resolution <= 90:
+        lat += resolution
+    if ref_lon + half < lon:
+        lon -= resolution
+    elif ref_lon - half > lon:
+        lon += resolution
+
+    return lat, lon
+
+
+def find_plus_code(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    m = PLUS_CODE_RE.search(text.upper())
+    return m.group(1) if m else None
+
+
+def locate(row: Dict) -> Tuple[Optional[float], Optional[float]]:
+    """(lat, lon) of a listing from a Plus Code in its area / address."""
+    code = find_plus_code(row.get("area")) or find_plus_code(row.get("address"))
+    if not code:
+        return None, None
+
+    if code.index(SEPARATOR) == SEPARATOR_POSITION:
+        lat, lon = decode(code)
+    else:
+        reference = CITY_REFERENCE_POINTS.get(normalize_text(row.get("city")))
+        if reference is None:
+            return None, None
+        lat, lon = recover_nearest(code, *reference)
+
+    return round(lat, 6), round(lon, 6)
+
+
+# ============================================================
+# Distance helpers
+# ============================================================
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) enclosing the radius."""
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    d_lon = d_lat / max(math.cos(math.radians(lat)), 1e-6)
+    return lat - d_lat, lat + d_lat, lon - d_lon, lon + d_lon
+
+
+def radius_clause(lat: float, lon: float, radius_km: float) -> str:
+    """SQL predicate: l.id within the radius's bounding box (R*Tree lookup)."""
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius_km)
+    return (
+        f"l.id IN (SELECT id FROM {GEO_TABLE} "
+        f"WHERE max_lat >= {min_lat:.6f} AND min_lat <= {max_lat:.6f} "
+        f"AND max_lon >= {min_lon:.6f} AND min_lon <= {max_lon:.6f})"
+    )
+
+
+# ============================================================
+# Coverage
+# ============================================================
+def unresolved_codes(conn: sqlite3.Connection) -> Counter:
+    """Listings per city that have a Plus Code but no coordinates."""
+    unresolved: Counter = Counter()
+    for r in conn.execute(
+        "SELECT city, area, address FROM google_maps_listings WHERE lat IS NULL"
+    ):
+        if find_plus_code(r[1]) or find_plus_code(r[2]):
+            unresolved[normalize_text(r[0]) or "(no city)"] += 1
+    return unresolved
+
+
+def report_unresolved(conn: sqlite3.Connection, limit: int = 20) -> None:
+    unresolved = unresolved_codes(conn)
+    if not unresolved:
+        return
+    print(
+        f"{sum(unresolved.values()):,} listings have a Plus Code that could not be "
+        f"resolved; add their cities to {CITY_REFERENCE_POINTS_PATH}:"
+    )
+    for city, count in unresolved.most_common(limit):
+        print(f"  {city}: {count:,}")
+
+
+# ============================================================
+# Schema
+# ============================================================
+def create_geo_index(conn: sqlite3.Connection) -> None:
+    """(Re)create the R*Tree over lat / lon + sync triggers and populate it."""
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {GEO_TABLE}_{suffix}")
+    conn.execute(f"DROP TABLE IF EXISTS {GEO_TABLE}")
+
+    conn.execute(
+        f"CREATE VIRTUAL TABLE {GEO_TABLE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {GEO_TABLE}_ai
+        AFTER INSERT ON google_maps_listings
+        WHEN new.lat IS NOT NULL AND new.lon IS NOT NULL BEGIN
+            INSERT INTO {GEO_TABLE} VALUES (new.id, new.lat, new.lat, new.lon, new.lon);
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER {GEO_TABLE}_ad
+        AFTER DELETE ON google_maps_listings BEGIN
+            DELETE FROM {GEO_TABLE} WHERE id = old.id;
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER {GEO_TABLE}_au
+        AFTER UPDATE OF lat, lon ON google_maps_listings BEGIN
+            DELETE FROM {GEO_TABLE} WHERE id = old.id;
+            INSERT INTO {GEO_TABLE}
+            SELECT new.id, new.lat, new.lat, new.lon, new.lon
+            WHERE new.lat IS NOT NULL AND new.lon IS NOT NULL;
+        END
+        """
+    )
+
+    conn.execute(
+        f"""
+        INSERT INTO {GEO_TABLE}
+        SELECT id, lat, lat, lon, lon FROM google_maps_listings
+        WHERE lat IS NOT NULL AND lon IS NOT NULL
+        """
+    )
+
+
+def main() -> None:
+    # imported here: db.connection -> db.migrations -> db.derived -> db.geo
+    from db.connection import write_transaction
+    from db.derived import refresh_derived
+
+    with write_transaction() as conn:
+        refresh_derived(conn, columns=["lat", "lon"])
+        located = conn.execute(
+            "SELECT COUNT(*) FROM google_maps_listings WHERE lat IS NOT NULL"
+        ).fetchone()[0]
+        print(f"Located {located:,} listings")
+        report_unresolved(conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# db/leaderboard.py
+"""
+Materialized "best <category> in <city>" leaderboards.
+
+category_leaderboard holds, for every (city_norm, category) pair, the
+LEADERBOARD_DEPTH best open listings as ranked by rank_results with the
+category as the query. "category" is either a listing's category_norm
+or its subcategory_norm, so a listing can sit on two boards.
+
+The search path answers exact city + category queries from here: a
+single primary-key range read followed by rank_results over at most
+LEADERBOARD_DEPTH rows, instead of ranking every listing on the board.
+Deeper requests rank board_candidates() directly: the same candidate
+predicate and the same query (the board's category), so both paths give
+the same order. Freshness is evaluated when a board is recomputed;
+rebuild daily (below) to keep it exact.
+
+Boards are filled at deploy time by `python -m db.migrations` (or
+rebuilt with `python -m db.leaderboard`) and kept current from the
+change log (db/changes.py) by a background thread (start_refresher):
+only the boards touched by changed listings, including boards a listing
+moved away from, are recomputed. Search never writes: while the boards
+are behind the change log it ranks board_candidates() instead.
+"""
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from db.changes import changes_since, latest_seq
+from db.connection import read_connection, write_transaction
+from db.db import rank_results
+from db.normalize import normalize_text
+from db.rows import fetch_rows_by_ids
+
+# Rows kept per board; search re-ranks these with the board's category
+LEADERBOARD_DEPTH = 50
+
+# Pause between background refreshes
+REFRESH_INTERVAL_SECONDS = 30
+
+Board = Tuple[str, str]
+
+
+def category_variants(category: str) -> List[str]:
+    """Simple singular / plural forms: 'restaurants' -> ['restaurants', 'restaurant']."""
+    variants = [category]
+    if category.endswith("es"):
+        variants += [category[:-2], category[:-1]]
+    elif category.endswith("s"):
+        variants.append(category[:-1])
+    else:
+        variants.append(category + "s")
+    return variants
+
+
+def _boards_of(city: Optional[str], category: Optional[str], subcategory: Optional[str]) -> Set[Board]:
+    if not city:
+        return set()
+    return {(city, label) for label in (category, subcategory) if label}
+
+
+# ============================================================
+# Build / refresh
+# ============================================================
+def _write_board(conn: sqlite3.Connection, board: Board, rows: List[Dict]) -> None:
+    ranked = rank_results(rows, board[1], top_n=LEADERBOARD_DEPTH)
+    conn.execute(
+        "DELETE FROM category_leaderboard WHERE city_norm = ? AND category_norm = ?",
+        board,
+    )
+    conn.executemany(
+        """
+        INSERT INTO category_leaderboard (city_norm, category_norm, rank, listing_id, score)
+        VALUES (?, ?, ?, ?, ?)
+        """,
+        [board + (rank, r["id"], r["score"]) for rank, r in enumerate(ranked, 1)],
+    )
+
+
+def _board_rows(conn: sqlite3.Connection, board: Board) -> List[Dict]:
+    """Every open listing that belongs on the board."""
+    return [
+        dict(r) for r in conn.execute(
+            """
+            SELECT * FROM google_maps_listings
+            WHERE city_norm = ?
+              AND (category_norm = ? OR subcategory_norm = ?)
+              AND is_permanently_closed IS NOT 1
+            ORDER BY rank_prefilter DESC, id
+            """,
+            (board[0], board[1], board[1]),
+        )
+    ]
+
+
+def _rank_board(conn: sqlite3.Connection, board: Board) -> None:
+    _write_board(conn, board, _board_rows(conn, board))
+
+
+def _set_state(conn: sqlite3.Connection, seq: int) -> None:
+    conn.execute(
+        "INSERT OR REPLACE INTO leaderboard_state (id, last_seq) VALUES (1, ?)",
+        (seq,),
+    )
+
+
+def rebuild_leaderboard() -> int:
+    """Recompute every board from scratch; returns the number of boards."""
+    with write_transaction() as conn:
+        head = latest_seq(conn)
+
+        boards: Dict[Board, List[Dict]] = defaultdict(list)
+        for r in conn.execute(
+            """
+            SELECT * FROM google_maps_listings
+            WHERE is_permanently_closed IS NOT 1
+            ORDER BY rank_prefilter DESC, id
+            """
+        ):
+            row = dict(r)
+            for board in _boards_of(row["city_norm"], row["category_norm"], row["subcategory_norm"]):
+                boards[board].append(row)
+
+        conn.execute("DELETE FROM category_leaderboard")
+        for board, rows in boards.items():
+            _write_board(conn, board, rows)
+
+        _set_state(conn, head)
+
+    return len(boards)
+
+
+def _last_seq() -> Optional[int]:
+    with read_connection() as conn:
+        row = conn.execute("SELECT last_seq FROM leaderboard_state WHERE id = 1").fetchone()
+    return None if row is None else row[0]
+
+
+def refresh_leaderboard(head: Optional[int] = None) -> int:
+    """
+    Bring the boards up to date with the change log and return the number
+    of boards recomputed. `head` is the caller's latest_seq(), if known;
+    when the boards are already at that point this is a single read.
+    """
+    last_seq = _last_seq()
+    if last_seq is None:
+        return rebuild_leaderboard()
+
+    if head is None:
+        head = latest_seq()
+    if last_seq >= head:
+        return 0
+
+    changes = changes_since(last_seq, limit=head - last_seq)
+    if not changes:
+        return 0
+
+    boards: Set[Board] = set()
+    changed_ids = set()
+    for change in changes:
+        # boards the listing was on before the change
+        boards |= _boards_of(
+            normalize_text(change["old_city"]),
+            normalize_text(change["old_category"]),
+            normalize_text(change["old_subcategory"]),
+        )
+        if change["op"] != "delete":
+            changed_ids.add(change["listing_id"])
+
+    with write_transaction() as conn:
+        for r in fetch_rows_by_ids(
+            conn, changed_ids, ["city_norm", "category_norm", "subcategory_norm"]
+        ):
+            boards |= _boards_of(r["city_norm"], r["category_norm"], r["subcategory_norm"])
+
+        for board in boards:
+            _rank_board(conn, board)
+
+        _set_state(conn, changes[-1]["seq"])
+
+    return len(boards)
+
+
+# ============================================================
+# Lookup
+# ============================================================
+def board_label(city: str, categories: Iterable[str]) -> Optional[str]:
+    """
+    The first of `categories` with a board in `city` (some open listing
+    has it as category or subcategory), or None.
+    """
+    with read_connection() as conn:
+        for category in categories:
+            row = conn.execute(
+                """
+                SELECT 1 FROM google_maps_listings
+                WHERE city_norm = ?
+                  AND (category_norm = ? OR subcategory_norm = ?)
+                  AND is_permanently_closed IS NOT 1
+                LIMIT 1
+                """,
+                (city, category, category),
+            ).fetchone()
+            if row:
+                return category
+    return None
+
+
+def boards_current(head: int) -> bool:
+    """Whether the boards include every change up to `head` (latest_seq())."""
+    last_seq = _last_seq()
+    return last_seq is not None and last_seq >= head
+
+
+def leaderboard_rows(city: str, category: str) -> List[Dict]:
+    """The LEADERBOARD_DEPTH best listings of a board, best first."""
+    with read_connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT l.*
+            FROM category_leaderboard b
+            JOIN google_maps_listings l ON l.id = b.listing_id
+            WHERE b.city_norm = ? AND b.category_norm = ?
+            ORDER BY b.rank
+            """,
+            (city, category),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def board_candidates(city: str, category: str) -> List[Dict]:
+    """Every listing the board is ranked from, for requests deeper than the board."""
+    with read_connection() as conn:
+        return _board_rows(conn, (city, category))
+
+
+# ============================================================
+# Background refresh
+# ============================================================
+_refresher: Optional[threading.Thread] = None
+_refresher_lock = threading.Lock()
+
+
+def _refresh_forever(interval: float) -> None:
+    while True:
+        try:
+            refresh_leaderboard()
+        except sqlite3.OperationalError:
+            # writer busy (bulk load, migration): retry on the next tick
+            pass
+        time.sleep(interval)
+
+
+def start_refresher(interval: float = REFRESH_INTERVAL_SECONDS) -> None:
+    """Keep the boards current from a daemon thread (once per process)."""
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = threading.Thread(
+                target=_refresh_forever, args=(interval,),
+                name="leaderboard-refresh", daemon=True,
+            )
+            _refresher.start()
+
+
+def main() -> None:
+    boards = rebuild_leaderboard()
+    print(f"Rebuilt {boards} city/category leaderboards")
+
+
+if __name__ == "__main__":
+    main()
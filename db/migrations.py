@@ -0,0 +1,376 @@
+# db/migrations.py
+"""
+Versioned schema migrations for db/businesses.db.
+
+The schema version lives in `PRAGMA user_version`. Every migration runs
+once, in order, inside its own write transaction; the version is bumped
+in the same transaction so a crash can never leave a half-applied step.
+
+Migrations can rewrite every row, so they run as a deploy step, not on
+the first request of the app:
+
+    python -m db.migrations
+
+which then brings the category leaderboards (db/leaderboard.py) up to
+date, so the app starts with them filled.
+
+db/connection.py refuses to serve an out-of-date database unless
+AUTO_MIGRATE is set (db/config.py).
+"""
+import sqlite3
+import time
+from typing import Callable, List, Tuple
+
+from db.derived import add_derived_columns, refresh_derived
+from db.geo import create_geo_index
+from db.search_index import create_search_index, create_trigram_index
+
+LISTING_COLUMNS = [
+    "name",
+    "address",
+    "website",
+    "phone_number",
+    "reviews_count",
+    "reviews_average",
+    "category",
+    "subcategory",
+    "city",
+    "state",
+    "area",
+    "created_at",
+    "owner_email",
+]
+
+# Source columns whose updates are recorded in listing_changes (derived
+# columns only ever change as a consequence of these)
+TRACKED_COLUMNS = [c for c in LISTING_COLUMNS if c != "created_at"]
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [r[1] for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+# ============================================================
+# Migrations
+# ============================================================
+def _add_primary_key_and_indexes(conn: sqlite3.Connection) -> None:
+    """
+    Rebuild google_maps_listings with `id INTEGER PRIMARY KEY`.
+
+    Existing ids are kept (first occurrence wins if an id is duplicated);
+    rows without an id, or with a duplicated one, get fresh ids.
+    """
+    if "owner_email" not in _table_columns(conn, "google_maps_listings"):
+        conn.execute("ALTER TABLE google_maps_listings ADD COLUMN owner_email TEXT")
+
+    cols = ", ".join(LISTING_COLUMNS)
+
+    conn.execute(
+        """
+        CREATE TABLE google_maps_listings_new (
+            "id" INTEGER PRIMARY KEY,
+            "name" TEXT,
+            "address" TEXT,
+            "website" TEXT,
+            "phone_number" TEXT,
+            "reviews_count" INTEGER,
+            "reviews_average" REAL,
+            "category" TEXT,
+            "subcategory" TEXT,
+            "city" TEXT,
+            "state" TEXT,
+            "area" TEXT,
+            "created_at" TEXT,
+            "owner_email" TEXT
+        )
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TEMP TABLE _kept_rowids AS
+        SELECT MIN(rowid) AS rid
+        FROM google_maps_listings
+        WHERE id IS NOT NULL
+        GROUP BY id
+        """
+    )
+
+    conn.execute(
+        f"""
+        INSERT INTO google_maps_listings_new (id, {cols})
+        SELECT CAST(id AS INTEGER), {cols}
+        FROM google_maps_listings
+        WHERE rowid IN (SELECT rid FROM _kept_rowids)
+        ORDER BY id
+        """
+    )
+
+    # Backfill: NULL / duplicate ids are assigned max(id)+1, max(id)+2, ...
+    conn.execute(
+        f"""
+        INSERT INTO google_maps_listings_new ({cols})
+        SELECT {cols}
+        FROM google_maps_listings
+        WHERE rowid NOT IN (SELECT rid FROM _kept_rowids)
+        ORDER BY rowid
+        """
+    )
+
+    conn.execute("DROP TABLE _kept_rowids")
+    conn.execute("DROP TABLE google_maps_listings")
+    conn.execute("ALTER TABLE google_maps_listings_new RENAME TO google_maps_listings")
+
+    conn.execute(
+        """
+        CREATE INDEX idx_listings_owner_created
+        ON google_maps_listings (owner_email, created_at)
+        """
+    )
+    conn.execute(
+        """
+        CREATE INDEX idx_listings_created_at
+        ON google_maps_listings (created_at)
+        """
+    )
+
+
+def _create_search_index(conn: sqlite3.Connection) -> None:
+    # FTS rowids now map to the stable INTEGER PRIMARY KEY
+    create_search_index(conn, ["name", "category", "subcategory", "area", "city"])
+
+
+# Each derived-column migration adds and backfills only the columns it
+# introduced (listed as they were at its schema version), so a fresh
+# database rewrites every row once per column group, not once per
+# migration for every current column.
+def _add_derived(conn: sqlite3.Connection, columns: List[str]) -> None:
+    add_derived_columns(conn, columns)
+    refresh_derived(conn, columns=columns)
+
+
+def _add_ranking_features(conn: sqlite3.Connection) -> None:
+    _add_derived(conn, [
+        "rank_base_score",
+        "rank_info_ratio",
+        "rank_popularity",
+        "is_permanently_closed",
+        "rank_prefilter",
+    ])
+
+
+def _add_normalized_phone(conn: sqlite3.Connection) -> None:
+    _add_derived(conn, ["phone_norm"])
+
+
+def _add_normalized_text(conn: sqlite3.Connection) -> None:
+    # *_norm shadow columns, then re-point the FTS index at them
+    _add_derived(conn, [
+        "name_norm",
+        "address_norm",
+        "category_norm",
+        "subcategory_norm",
+        "area_norm",
+        "city_norm",
+        "state_norm",
+    ])
+    create_search_index(conn)
+
+
+def _add_fingerprint(conn: sqlite3.Connection) -> None:
+    # fingerprint + its UNIQUE index; backfill walks ids in order so the
+    # oldest listing of each duplicate group keeps the fingerprint
+    _add_derived(conn, ["fingerprint"])
+
+
+def _add_row_versioning(conn: sqlite3.Connection) -> None:
+    # optimistic concurrency for business_update (version) + audit time
+    columns = _table_columns(conn, "google_maps_listings")
+    if "version" not in columns:
+        conn.execute(
+            "ALTER TABLE google_maps_listings ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+        )
+    if "updated_at" not in columns:
+        conn.execute("ALTER TABLE google_maps_listings ADD COLUMN updated_at TEXT")
+
+
+def _create_change_log(conn: sqlite3.Connection) -> None:
+    # append-only log read by db/changes.py; filled by triggers so writes
+    # from any process or tool are seen by cache / index consumers
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS listing_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            listing_id INTEGER NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+            old_city TEXT,
+            old_category TEXT,
+            old_subcategory TEXT,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+        )
+        """
+    )
+
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS listing_changes_ai
+        AFTER INSERT ON google_maps_listings BEGIN
+            INSERT INTO listing_changes (listing_id, op) VALUES (new.id, 'insert');
+        END
+        """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS listing_changes_au
+        AFTER UPDATE OF {", ".join(TRACKED_COLUMNS)} ON google_maps_listings BEGIN
+            INSERT INTO listing_changes (listing_id, op, old_city, old_category, old_subcategory)
+            VALUES (new.id, 'update', old.city, old.category, old.subcategory);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS listing_changes_ad
+        AFTER DELETE ON google_maps_listings BEGIN
+            INSERT INTO listing_changes (listing_id, op, old_city, old_category, old_subcategory)
+            VALUES (old.id, 'delete', old.city, old.category, old.subcategory);
+        END
+        """
+    )
+
+
+def _create_leaderboard(conn: sqlite3.Connection) -> None:
+    # precomputed top-N per (city, category); filled by db/leaderboard.py
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS category_leaderboard (
+            city_norm TEXT NOT NULL,
+            category_norm TEXT NOT NULL,
+            rank INTEGER NOT NULL,
+            listing_id INTEGER NOT NULL,
+            score REAL,
+            PRIMARY KEY (city_norm, category_norm, rank)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_seq INTEGER NOT NULL
+        )
+        """
+    )
+    # boards are also keyed by subcategory
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_listings_city_subcategory_norm
+        ON google_maps_listings (city_norm, subcategory_norm)
+        """
+    )
+
+
+def _create_trigram_index(conn: sqlite3.Connection) -> None:
+    # substring / fuzzy name + address lookups (db/db.py trigram_search)
+    create_trigram_index(conn)
+
+
+def _add_coordinates(conn: sqlite3.Connection) -> None:
+    # lat / lon derived columns, backfilled before the R*Tree is built
+    _add_derived(conn, ["lat", "lon"])
+    create_geo_index(conn)
+
+
+def _drop_unused_indexes(conn: sqlite3.Connection) -> None:
+    # filters moved to the *_norm columns (idx_listings_city_category_norm)
+    # and names are matched through FTS / trigram; these indexes only
+    # slowed down every write. New databases no longer create them.
+    for name in ("idx_listings_city_category", "idx_listings_category", "idx_listings_name_norm"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+MIGRATIONS: List[Tuple[int, Callable[[sqlite3.Connection], None]]] = [
+    (1, _add_primary_key_and_indexes),
+    (2, _create_search_index),
+    (3, _add_ranking_features),
+    (4, _add_normalized_phone),
+    (5, _add_normalized_text),
+    (6, _add_fingerprint),
+    (7, _add_row_versioning),
+    (8, _create_change_log),
+    (9, _create_leaderboard),
+    (10, _create_trigram_index),
+    (11, _add_coordinates),
+    (12, _drop_unused_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+# ============================================================
+# Runner
+# ============================================================
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """
+    Apply all pending migrations and return the resulting schema version.
+    Safe to call on every startup: it is a single PRAGMA read when the
+    database is already up to date.
+    """
+    if get_schema_version(conn) >= SCHEMA_VERSION:
+        return get_schema_version(conn)
+
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None   # explicit transaction control
+
+    try:
+        for version, migrate in MIGRATIONS:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # re-check under the write lock: another process may have won
+                if get_schema_version(conn) >= version:
+                    conn.execute("ROLLBACK")
+                    continue
+
+                migrate(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = previous_isolation
+
+    return get_schema_version(conn)
+
+
+def main() -> None:
+    # own connection: db.connection would refuse the outdated schema
+    from db.config import BUSY_TIMEOUT_MS, DB_PATH
+
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        before = get_schema_version(conn)
+        started = time.perf_counter()
+        after = run_migrations(conn)
+    finally:
+        conn.close()
+    print(
+        f"Schema version {before} -> {after} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+    # after the schema is current: db.leaderboard needs db.connection
+    from db.leaderboard import refresh_leaderboard
+
+    started = time.perf_counter()
+    boards = refresh_leaderboard()
+    print(f"Refreshed {boards} leaderboards in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
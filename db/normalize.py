@@ -0,0 +1,58 @@
+# db/normalize.py
+"""
+Canonical forms of listing fields, used for the indexed *_norm columns
+(see db/derived.py) and for normalizing user input before lookups.
+"""
+import hashlib
+import re
+import unicodedata
+
+PHONE_DIGITS = 10   # Indian mobile / landline numbers without prefix
+
+
+def normalize_phone(raw) -> str | None:
+    """
+    Digits-only, last-10-digit canonical phone number:
+
+        "090107 38078"    -> "9010738078"
+        "+91 90107-38078" -> "9010738078"
+
+    Shorter numbers keep all their digits; no digits at all -> None.
+    """
+    if raw is None:
+        return None
+    digits = re.sub(r"\D", "", str(raw))
+    if not digits:
+        return None
+    return digits[-PHONE_DIGITS:]
+
+
+def normalize_text(raw) -> str:
+    """
+    Search form of a text field: NFKC, casefolded, punctuation replaced by
+    spaces, whitespace collapsed. Styled Unicode (e.g. mathematical bold
+    "𝐀𝐑𝐒 𝐃𝐈𝐆𝐈𝐓𝐀𝐋") folds to plain text ("ars digital").
+
+    None -> "" so NULL and empty values compare equal, like IFNULL(x, '').
+    """
+    if raw is None:
+        return ""
+    text = unicodedata.normalize("NFKC", str(raw)).casefold()
+    return " ".join(re.findall(r"\w+", text))
+
+
+def listing_fingerprint(name, address, area, city, state, phone_number) -> str:
+    """
+    Content fingerprint of a listing's identity fields (normalized name,
+    address, area, city, state, phone). Two listings that add_business
+    would treat as duplicates always share a fingerprint.
+    """
+    parts = [
+        normalize_text(name),
+        normalize_text(address),
+        normalize_text(area),
+        normalize_text(city),
+        normalize_text(state),
+        normalize_phone(phone_number) or "",
+    ]
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
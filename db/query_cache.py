@@ -0,0 +1,174 @@
+# db/query_cache.py
+"""
+In-process LRU + TTL cache for final ranked search results.
+
+Entries are stamped with the data generation current at the time they
+were stored. Every write to google_maps_listings (add_business,
+update_business) calls bump_generation(), so entries computed before the
+write are treated as misses immediately instead of lingering until the
+TTL expires. Callers can also supply their own generation (e.g. the
+change-log sequence from db/changes.py, which also sees writes made by
+other processes).
+"""
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+# ============================================================
+# Data generation (bumped on every listing write)
+# ============================================================
+_generation = 0
+_generation_lock = threading.Lock()
+
+
+def current_generation() -> int:
+    return _generation
+
+
+def bump_generation() -> int:
+    global _generation
+    with _generation_lock:
+        _generation += 1
+        return _generation
+
+
+# ============================================================
+# Helpers
+# ============================================================
+def normalize_query(query: str) -> str:
+    """'  Dentist in MUMBAI!! ' -> 'dentist in mumbai'"""
+    return " ".join(re.findall(r"\w+", (query or "").lower()))
+
+
+def estimate_size(value: Any) -> int:
+    """Cheap approximate memory footprint (bytes) of a cached value."""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+# ============================================================
+# Cache
+# ============================================================
+class QueryCache:
+    """
+    Thread-safe LRU cache with a TTL, an entry limit and an approximate
+    memory limit. Expired or stale-generation entries count as misses.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 600.0,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        # key -> (value, size, expires_at, generation)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, generation: Optional[Hashable] = None) -> Optional[Any]:
+        """Cached value, or None if missing, expired or from another generation."""
+        if generation is None:
+            generation = _generation
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at, stored_generation = entry
+            if expires_at < time.monotonic() or stored_generation != generation:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        generation: Optional[Hashable] = None,
+        ttl_seconds: Optional[float] = None,
+    ) -> None:
+        """
+        Store a value. Pass the generation read *before* computing the
+        value so a write that lands mid-computation invalidates it.
+        `ttl_seconds` shortens this entry's lifetime below the cache's
+        TTL (e.g. what is left of a copy's lifetime elsewhere).
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        if generation is None:
+            generation = _generation
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (
+                value,
+                size,
+                time.monotonic() + ttl,
+                generation,
+            )
+            self._bytes += size
+
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "generation": _generation,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        value, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,30 @@
+# db/rows.py
+"""
+Fetching listings by id.
+
+SQLite caps the number of bound parameters per statement, so id lists of
+unbounded length are looked up in chunks of ID_CHUNK_SIZE. Kept free of
+db.connection imports: db/derived.py uses it during migrations.
+"""
+import sqlite3
+from typing import Iterable, Iterator, Sequence, Union
+
+ID_CHUNK_SIZE = 500
+
+
+def fetch_rows_by_ids(
+    conn: sqlite3.Connection,
+    ids: Iterable[int],
+    columns: Union[str, Sequence[str]] = "*",
+    table: str = "google_maps_listings",
+) -> Iterator[sqlite3.Row]:
+    """Rows of `table` whose id is in `ids` (any order), selecting `columns`."""
+    ids = list(ids)
+    select = columns if isinstance(columns, str) else ", ".join(columns)
+    for i in range(0, len(ids), ID_CHUNK_SIZE):
+        part = ids[i:i + ID_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in part)
+        yield from conn.execute(
+            f"SELECT {select} FROM {table} WHERE id IN ({placeholders})",
+            part,
+        )
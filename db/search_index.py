@@ -0,0 +1,239 @@
+# db/search_index.py
+"""
+FTS5 full-text index over google_maps_listings.
+
+The index is an external-content FTS5 table: it stores only the inverted
+index and reads column values back from google_maps_listings, so it adds
+very little to the database size. Triggers keep it in sync with every
+INSERT / UPDATE / DELETE on the base table.
+
+A second external-content table, listings_trigram, indexes normalized
+name and address with the trigram tokenizer. It serves substring and
+fuzzy (typo / partial name) lookups that LIKE '%fragment%' would answer
+with a full scan.
+"""
+import sqlite3
+from typing import Iterable, List, Set
+
+from db.normalize import normalize_text
+
+FTS_TABLE = "listings_fts"
+
+# Columns indexed for search (must exist on google_maps_listings).
+# These are the normalized shadow columns from db/derived.py, so styled
+# Unicode names are searchable as plain text.
+FTS_COLUMNS = ["name_norm", "category_norm", "subcategory_norm", "area_norm", "city_norm"]
+
+# Columns the service keywords are matched against
+KEYWORD_COLUMNS = ["name_norm", "category_norm", "subcategory_norm"]
+
+# bm25 column weights, same order as FTS_COLUMNS
+BM25_WEIGHTS = (4.0, 2.0, 2.0, 1.0, 1.0)
+
+TRIGRAM_TABLE = "listings_trigram"
+TRIGRAM_COLUMNS = ["name_norm", "address_norm"]
+
+
+def create_search_index(conn: sqlite3.Connection, columns: List[str] = FTS_COLUMNS) -> None:
+    """
+    (Re)create the FTS5 table + sync triggers and populate the index.
+    Runs inside the caller's transaction (see db/migrations.py).
+
+    `columns` lets older migrations build the index as it was at their
+    schema version.
+    """
+    def _column_list(prefix: str = "") -> str:
+        return ", ".join(f"{prefix}{c}" for c in columns)
+
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+    conn.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+            {_column_list()},
+            content='google_maps_listings',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {FTS_TABLE}_ai
+        AFTER INSERT ON google_maps_listings BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {_column_list()})
+            VALUES (new.id, {_column_list('new.')});
+        END
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {FTS_TABLE}_ad
+        AFTER DELETE ON google_maps_listings BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_column_list()})
+            VALUES ('delete', old.id, {_column_list('old.')});
+        END
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {FTS_TABLE}_au
+        AFTER UPDATE OF {_column_list()} ON google_maps_listings BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_column_list()})
+            VALUES ('delete', old.id, {_column_list('old.')});
+            INSERT INTO {FTS_TABLE}(rowid, {_column_list()})
+            VALUES (new.id, {_column_list('new.')});
+        END
+        """
+    )
+
+    rebuild_search_index(conn)
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> None:
+    """Re-read every row of google_maps_listings into the FTS index."""
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def create_trigram_index(conn: sqlite3.Connection) -> None:
+    """(Re)create the trigram FTS5 table + sync triggers and populate it."""
+    columns = ", ".join(TRIGRAM_COLUMNS)
+    old_columns = ", ".join(f"old.{c}" for c in TRIGRAM_COLUMNS)
+    new_columns = ", ".join(f"new.{c}" for c in TRIGRAM_COLUMNS)
+
+    for suffix in ("ai", "ad", "au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {TRIGRAM_TABLE}_{suffix}")
+    conn.execute(f"DROP TABLE IF EXISTS {TRIGRAM_TABLE}")
+
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE {TRIGRAM_TABLE} USING fts5(
+            {columns},
+            content='google_maps_listings',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {TRIGRAM_TABLE}_ai
+        AFTER INSERT ON google_maps_listings BEGIN
+            INSERT INTO {TRIGRAM_TABLE}(rowid, {columns})
+            VALUES (new.id, {new_columns});
+        END
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {TRIGRAM_TABLE}_ad
+        AFTER DELETE ON google_maps_listings BEGIN
+            INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, {columns})
+            VALUES ('delete', old.id, {old_columns});
+        END
+        """
+    )
+
+    conn.execute(
+        f"""
+        CREATE TRIGGER {TRIGRAM_TABLE}_au
+        AFTER UPDATE OF {columns} ON google_maps_listings BEGIN
+            INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, {columns})
+            VALUES ('delete', old.id, {old_columns});
+            INSERT INTO {TRIGRAM_TABLE}(rowid, {columns})
+            VALUES (new.id, {new_columns});
+        END
+        """
+    )
+
+    conn.execute(f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('rebuild')")
+
+
+# ============================================================
+# Query building
+# ============================================================
+def fts_terms(text: str) -> List[str]:
+    """Split free text into FTS-safe search terms (word characters only)."""
+    return normalize_text(text).split()
+
+
+def build_match_expression(keywords: Iterable[str]) -> str:
+    """
+    Build an FTS5 MATCH expression that matches any keyword as a prefix
+    in (normalized) name / category / subcategory.
+
+    Every term is reduced to word characters and double-quoted, so user
+    input can never inject FTS5 operators.
+    """
+    terms = []
+    for k in keywords:
+        for t in fts_terms(k):
+            if len(t) < 2:
+                continue
+            if f'"{t}"*' not in terms:
+                terms.append(f'"{t}"*')
+
+    if not terms:
+        return ""
+
+    columns = " ".join(KEYWORD_COLUMNS)
+    return f"{{{columns}}} : ({' OR '.join(terms)})"
+
+
+def build_phrase_expression(text: str) -> str:
+    """
+    FTS5 MATCH expression for `text` as one phrase (its words adjacent,
+    in order) in name / category / subcategory; "" if it has no words.
+    """
+    terms = [t for t in fts_terms(text) if len(t) >= 2]
+    if not terms:
+        return ""
+    columns = " ".join(KEYWORD_COLUMNS)
+    return f'{{{columns}}} : "{" ".join(terms)}"'
+
+
+def bm25_expression() -> str:
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    return f"bm25({FTS_TABLE}, {weights})"
+
+
+# ============================================================
+# Trigram matching
+# ============================================================
+def trigrams(text: str) -> Set[str]:
+    """Character trigrams of the normalized text ('cafe' -> {'caf', 'afe'})."""
+    t = normalize_text(text)
+    return {t[i:i + 3] for i in range(len(t) - 2)}
+
+
+def build_trigram_match(text: str, column: str = "name_norm") -> str:
+    """
+    MATCH expression for rows sharing any trigram with `text` in `column`.
+    The posting lists are OR-ed; callers rank the candidates by
+    trigram_similarity. Trigrams come from normalized text (word characters
+    and spaces) and are double-quoted, so input cannot inject FTS5 syntax.
+    """
+    terms = [f'"{g}"' for g in sorted(trigrams(text))]
+    if not terms:
+        return ""
+    return f"{{{column}}} : ({' OR '.join(terms)})"
+
+
+def trigram_similarity(query_grams: Set[str], text: str):
+    """
+    (containment, jaccard) of the query trigrams in `text`: containment is
+    1.0 when the query is a substring-like fragment of the text, jaccard
+    rewards texts that are close to the query as a whole.
+    """
+    grams = trigrams(text)
+    if not query_grams or not grams:
+        return 0.0, 0.0
+    shared = len(query_grams & grams)
+    return shared / len(query_grams), shared / len(query_grams | grams)
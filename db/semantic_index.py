@@ -0,0 +1,225 @@
+# db/semantic_index.py
+"""
+Offline semantic retrieval index over listings.
+
+Each listing's name / category / subcategory is embedded with latent
+semantic analysis: hashed word TF-IDF (HashingVectorizer, so there is
+no vocabulary to store) reduced by TruncatedSVD to SEMANTIC_DIMENSIONS
+dense dimensions. Words that co-occur in listings end up close
+together, so "tooth doctor" finds dentists and "website design" finds
+digital marketing agencies even though no keyword matches.
+
+Build (no network / GPU needed), then restart the app:
+
+    python -m db.semantic_index
+
+Artifacts in SEMANTIC_INDEX_DIR, all plain .npy files memory-mapped at
+query time:
+    vectors.npy     float32 (n, d), L2-normalized listing vectors
+    ids.npy         int64 listing ids, row-aligned with vectors.npy
+    projection.npy  float32 (HASH_FEATURES, d): idf-weighted SVD
+                    components; a text's vector is normalize(tf @ projection)
+
+Search is an exact dot-product top-k over the matrix in blocks (a few
+tens of milliseconds at 1M rows). Listings added after the last build
+are not in the index until it is rebuilt; deleted ones are dropped when
+their ids are joined back to the table.
+"""
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from db.config import SEMANTIC_INDEX_DIR
+
+SEMANTIC_DIMENSIONS = 128
+HASH_FEATURES = 2 ** 17
+SEARCH_BLOCK_ROWS = 65536
+BUILD_BATCH_SIZE = 20000
+SVD_SAMPLE_SIZE = 200000    # rows used to fit the SVD on large tables
+
+TEXT_FIELDS = ["name_norm", "category_norm", "subcategory_norm"]
+
+VECTORS_PATH = os.path.join(SEMANTIC_INDEX_DIR, "vectors.npy")
+IDS_PATH = os.path.join(SEMANTIC_INDEX_DIR, "ids.npy")
+PROJECTION_PATH = os.path.join(SEMANTIC_INDEX_DIR, "projection.npy")
+
+
+def _listing_text(row) -> str:
+    return " ".join(row[f] or "" for f in TEXT_FIELDS)
+
+
+def _term_frequencies(texts: List[str]):
+    """Sparse sublinear (1 + log tf) hashed word counts."""
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    counts = HashingVectorizer(
+        n_features=HASH_FEATURES,
+        alternate_sign=False,
+        norm=None,
+    ).transform(texts)
+    counts.data = 1.0 + np.log(counts.data)
+    return counts
+
+
+def _embed(projection: np.ndarray, texts: List[str]) -> np.ndarray:
+    # gather only the projection rows of words present (a sparse @ dense
+    # product would touch the whole, memory-mapped, projection)
+    tf = _term_frequencies(texts).tocsr()
+    vectors = np.zeros((tf.shape[0], projection.shape[1]), dtype=np.float32)
+    for i in range(tf.shape[0]):
+        start, end = tf.indptr[i], tf.indptr[i + 1]
+        if start != end:
+            vectors[i] = tf.data[start:end] @ projection[tf.indices[start:end]]
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+
+# ============================================================
+# Build
+# ============================================================
+def build_index(sample_size: int = SVD_SAMPLE_SIZE) -> int:
+    """Embed every listing and write the index files; returns the row count."""
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.preprocessing import normalize
+
+    from db.connection import read_connection
+
+    with read_connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, {', '.join(TEXT_FIELDS)} FROM google_maps_listings ORDER BY id"
+        ).fetchall()
+
+    ids = np.array([r["id"] for r in rows], dtype=np.int64)
+    texts = [_listing_text(r) for r in rows]
+    if not texts:
+        return 0
+
+    # fit idf + SVD on (a sample of) the corpus
+    rng = np.random.default_rng(0)
+    sample = (
+        texts if len(texts) <= sample_size
+        else [texts[i] for i in rng.choice(len(texts), sample_size, replace=False)]
+    )
+    tf = _term_frequencies(sample).tocsr()
+    df = np.bincount(tf.indices, minlength=HASH_FEATURES)
+    idf = np.log((1 + len(sample)) / (1 + df)) + 1
+
+    dimensions = min(SEMANTIC_DIMENSIONS, len(sample) - 1)
+    svd = TruncatedSVD(n_components=dimensions, random_state=0)
+    svd.fit(normalize(tf.multiply(idf).tocsr()))
+    projection = np.ascontiguousarray(
+        (idf[:, None] * svd.components_.T).astype(np.float32)
+    )
+
+    os.makedirs(SEMANTIC_INDEX_DIR, exist_ok=True)
+    tmp_vectors = VECTORS_PATH + ".tmp.npy"
+    vectors = np.lib.format.open_memmap(
+        tmp_vectors, mode="w+", dtype=np.float32, shape=(len(texts), dimensions)
+    )
+    for start in range(0, len(texts), BUILD_BATCH_SIZE):
+        vectors[start:start + BUILD_BATCH_SIZE] = _embed(
+            projection, texts[start:start + BUILD_BATCH_SIZE]
+        )
+    vectors.flush()
+    del vectors
+
+    # swap in the new files only once they are complete
+    np.save(IDS_PATH + ".tmp.npy", ids)
+    np.save(PROJECTION_PATH + ".tmp.npy", projection)
+    os.replace(tmp_vectors, VECTORS_PATH)
+    os.replace(IDS_PATH + ".tmp.npy", IDS_PATH)
+    os.replace(PROJECTION_PATH + ".tmp.npy", PROJECTION_PATH)
+
+    reset_index()
+    return len(texts)
+
+
+# ============================================================
+# Search
+# ============================================================
+class SemanticIndex:
+    def __init__(self, vectors: np.ndarray, ids: np.ndarray, projection: np.ndarray):
+        self.vectors = vectors
+        self.ids = ids
+        self.projection = projection
+
+    def search(self, query: str, k: int = 50) -> List[Tuple[int, float]]:
+        """(listing id, cosine similarity) of the k nearest listings, best first."""
+        if k <= 0 or not query.strip() or not len(self.ids):
+            return []
+
+        q = _embed(self.projection, [query])[0]
+        if not q.any():
+            return []   # no indexed word in the query
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+
+        for start in range(0, len(self.ids), SEARCH_BLOCK_ROWS):
+            scores = self.vectors[start:start + SEARCH_BLOCK_ROWS] @ q
+            if len(scores) > k:
+                top = np.argpartition(scores, -k)[-k:]
+            else:
+                top = np.arange(len(scores))
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top + start])
+            if len(best_scores) > k:
+                keep = np.argpartition(best_scores, -k)[-k:]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+
+        order = np.argsort(-best_scores, kind="stable")
+        return [
+            (int(self.ids[best_rows[i]]), float(best_scores[i]))
+            for i in order
+        ]
+
+
+_index: Optional[SemanticIndex] = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_index() -> Optional[SemanticIndex]:
+    """The on-disk index, loaded on first use; None if it was never built."""
+    global _index, _loaded
+    with _lock:
+        if not _loaded:
+            _loaded = True
+            if all(os.path.exists(p) for p in (VECTORS_PATH, IDS_PATH, PROJECTION_PATH)):
+                _index = SemanticIndex(
+                    np.load(VECTORS_PATH, mmap_mode="r"),
+                    np.load(IDS_PATH, mmap_mode="r"),
+                    np.load(PROJECTION_PATH, mmap_mode="r"),
+                )
+        return _index
+
+
+def reset_index() -> None:
+    global _index, _loaded
+    with _lock:
+        _index, _loaded = None, False
+
+
+def semantic_search(query: str, k: int = 50, min_similarity: float = 0.0) -> List[Tuple[int, float]]:
+    index = get_index()
+    if index is None:
+        return []
+    return [(i, s) for i, s in index.search(query, k) if s >= min_similarity]
+
+
+def main() -> None:
+    started = time.perf_counter()
+    count = build_index()
+    print(
+        f"Indexed {count} listings into {SEMANTIC_INDEX_DIR} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
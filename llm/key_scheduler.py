@@ -0,0 +1,205 @@
+# llm/key_scheduler.py
+"""
+Rate-limit-aware selection among several OpenRouter API keys.
+
+Each key has
+- a token bucket (KEY_RATE_PER_MINUTE, up to KEY_BURST at once), so we
+  stop sending before the provider starts answering 429,
+- a "throttled until" time, set from Retry-After / X-RateLimit-Reset on
+  429s or from jittered exponential backoff after failures,
+- a circuit breaker: after CIRCUIT_THRESHOLD consecutive failures the
+  key is skipped for CIRCUIT_COOLDOWN seconds, then gets one trial call.
+
+acquire() returns the least-loaded usable key (fewest calls in flight,
+then most tokens left), waiting for the earliest one to free up if none
+is usable; release() reports how the call went.
+
+    key = scheduler.acquire()
+    try:
+        response = ...
+    except requests.RequestException:
+        scheduler.release(key, failed=True)
+        raise
+    scheduler.release(key, response.status_code, response.headers)
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Mapping, Optional
+
+KEY_RATE_PER_MINUTE = 20
+KEY_BURST = 5
+ACQUIRE_TIMEOUT = 30.0          # seconds to wait for any usable key
+
+BACKOFF_BASE = 0.5              # seconds; doubled per consecutive failure
+BACKOFF_MAX = 30.0
+CIRCUIT_THRESHOLD = 3
+CIRCUIT_COOLDOWN = 60.0
+
+
+def backoff_delay(failures: int) -> float:
+    """Exponential backoff with jitter: uniform in [d/2, d]."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** max(failures - 1, 0)))
+    return random.uniform(delay / 2, delay)
+
+
+def retry_after_seconds(headers: Optional[Mapping[str, str]], now: float) -> Optional[float]:
+    """
+    Seconds to wait according to Retry-After (seconds or an HTTP date) or
+    X-RateLimit-Reset (epoch seconds or milliseconds); None if absent.
+    """
+    if not headers:
+        return None
+
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(value).timestamp() - now, 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    value = headers.get("X-RateLimit-Reset")
+    if value:
+        try:
+            reset = float(value)
+        except ValueError:
+            return None
+        if reset > 1e11:        # milliseconds
+            reset /= 1000.0
+        return max(reset - now, 0.0)
+
+    return None
+
+
+class _KeyState:
+    __slots__ = ("tokens", "updated", "in_flight", "failures", "throttled_until", "open_until")
+
+    def __init__(self, now: float):
+        self.tokens = float(KEY_BURST)
+        self.updated = now
+        self.in_flight = 0
+        self.failures = 0
+        self.throttled_until = 0.0
+        self.open_until = 0.0
+
+
+class KeyScheduler:
+    def __init__(
+        self,
+        keys: List[str],
+        rate_per_minute: float = KEY_RATE_PER_MINUTE,
+        burst: int = KEY_BURST,
+    ):
+        if not keys:
+            raise ValueError("KeyScheduler needs at least one key")
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        now = time.monotonic()
+        self._keys = {k: _KeyState(now) for k in keys}
+        self._cond = threading.Condition()
+
+    # ------------------------------
+    # Selection
+    # ------------------------------
+    def _refill(self, state: _KeyState, now: float) -> None:
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+        state.updated = now
+
+    def _ready_at(self, state: _KeyState, now: float) -> float:
+        """Earliest time the key may be used."""
+        ready = max(state.throttled_until, state.open_until, now)
+        if state.open_until > now or state.failures >= CIRCUIT_THRESHOLD:
+            # open or half-open breaker: one trial call at a time
+            if state.in_flight:
+                return float("inf")
+        if state.tokens < 1.0:
+            ready = max(ready, now + (1.0 - state.tokens) / self.rate)
+        return ready
+
+    def acquire(self, timeout: float = ACQUIRE_TIMEOUT) -> str:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                best, best_rank, next_ready = None, None, deadline
+                for key, state in self._keys.items():
+                    self._refill(state, now)
+                    ready = self._ready_at(state, now)
+                    if ready <= now:
+                        rank = (state.in_flight, -state.tokens)
+                        if best_rank is None or rank < best_rank:
+                            best, best_rank = key, rank
+                    else:
+                        next_ready = min(next_ready, ready)
+
+                if best is not None:
+                    state = self._keys[best]
+                    state.tokens -= 1.0
+                    state.in_flight += 1
+                    return best
+
+                if now >= deadline:
+                    raise RuntimeError("No OpenRouter API key available (all throttled)")
+                self._cond.wait(timeout=max(next_ready - now, 0.01))
+
+    # ------------------------------
+    # Feedback
+    # ------------------------------
+    def release(
+        self,
+        key: str,
+        status: Optional[int] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        failed: bool = False,
+    ) -> None:
+        """
+        Report a finished call: its HTTP status and headers, or
+        failed=True for a transport error (timeout, connection reset).
+        """
+        with self._cond:
+            state = self._keys[key]
+            now = time.monotonic()
+            state.in_flight = max(state.in_flight - 1, 0)
+
+            if not failed and status is not None and status < 500 and status != 429:
+                # success, or a client error that says nothing about the key's health
+                state.failures = 0
+                state.open_until = 0.0
+            else:
+                state.failures += 1
+                wait = retry_after_seconds(headers, time.time()) if status == 429 else None
+                if wait is None:
+                    wait = backoff_delay(state.failures)
+                state.throttled_until = max(state.throttled_until, now + wait)
+                if status == 429:
+                    state.tokens = min(state.tokens, 0.0)
+                if state.failures >= CIRCUIT_THRESHOLD:
+                    state.open_until = now + CIRCUIT_COOLDOWN
+
+            remaining = (headers or {}).get("X-RateLimit-Remaining")
+            if remaining is not None:
+                try:
+                    state.tokens = min(state.tokens, float(remaining))
+                except ValueError:
+                    pass
+
+            self._cond.notify_all()
+
+    def stats(self) -> List[Dict]:
+        with self._cond:
+            now = time.monotonic()
+            return [
+                {
+                    "key": f"...{key[-4:]}",
+                    "tokens": round(state.tokens, 2),
+                    "in_flight": state.in_flight,
+                    "failures": state.failures,
+                    "throttled_for": round(max(state.throttled_until - now, 0.0), 1),
+                    "circuit_open": state.open_until > now,
+                }
+                for key, state in self._keys.items()
+            ]
@@ -5,6 +5,9 @@ import os
 import time
 from dotenv import load_dotenv
 
+from core import http_client
+from llm.key_scheduler import KeyScheduler
+
 load_dotenv()
 
 OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
@@ -21,49 +24,55 @@ API_KEYS = [k.strip() for k in raw_keys.split(",") if k.strip()]
 if not API_KEYS:
     raise RuntimeError("No OpenRouter API keys found")
 
+# Picks the least-loaded key that is not rate limited (llm/key_scheduler.py)
+SCHEDULER = KeyScheduler(API_KEYS)
+
 def call_llm(messages, model, max_retries=2):
     last_error = None
 
-    for _ in range(max_retries):
-        for key in API_KEYS:
-            try:
-                response = requests.post(
-                    OPENROUTER_URL,
-                    headers={
-                        "Authorization": f"Bearer {key}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "http://localhost",
-                        "X-Title": "HBD-Local-Business-AI"
-                    },
-                    json={
-                        "model": model,
-                        "messages": messages
-                    },
-                    timeout=30
-                )
+    # same attempt budget as one fixed-order pass over the keys per retry,
+    # but each attempt goes to a key the scheduler considers usable
+    for _ in range(max_retries * len(API_KEYS)):
+        key = SCHEDULER.acquire()
+        try:
+            response = http_client.post(
+                OPENROUTER_URL,
+                headers={
+                    "Authorization": f"Bearer {key}",
+                    "Content-Type": "application/json",
+                    "HTTP-Referer": "http://localhost",
+                    "X-Title": "HBD-Local-Business-AI"
+                },
+                json={
+                    "model": model,
+                    "messages": messages
+                }
+            )
+        except requests.exceptions.RequestException as e:
+            SCHEDULER.release(key, failed=True)
+            last_error = e
+            continue
 
-                # 🔴 LOG REAL ERROR FROM OPENROUTER
-                if response.status_code != 200:
-                    print("OPENROUTER ERROR STATUS:", response.status_code)
-                    print("OPENROUTER ERROR BODY:", response.text)
+        SCHEDULER.release(key, response.status_code, response.headers)
 
-                if response.status_code == 429:
-                    continue
+        # 🔴 LOG REAL ERROR FROM OPENROUTER
+        if response.status_code != 200:
+            print("OPENROUTER ERROR STATUS:", response.status_code)
+            print("OPENROUTER ERROR BODY:", response.text)
 
-                response.raise_for_status()
-                return response.json()["choices"][0]["message"]
+        if response.status_code in (400, 401):
+            # These will NEVER succeed on retry
+            raise RuntimeError(
+                f"OpenRouter rejected request: {response.text}"
+            )
 
-            except requests.exceptions.HTTPError as e:
-                last_error = e
-                if response.status_code in (400, 401):
-                    # These will NEVER succeed on retry
-                    raise RuntimeError(
-                        f"OpenRouter rejected request: {response.text}"
-                    )
-                continue
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            # 429 / 5xx: the scheduler backs this key off, try another
+            last_error = e
+            continue
 
-            except requests.exceptions.RequestException as e:
-                last_error = e
-                continue
+        return response.json()["choices"][0]["message"]
 
     raise RuntimeError(f"LLM call failed after retries: {last_error}")
@@ -0,0 +1,185 @@
+# llm/response_cache.py
+"""
+Persistent cache of LLM chat answers.
+
+Answers are stored in their own SQLite file (LLM_CACHE_PATH, not the
+listings database) keyed by
+
+    sha256(model, sha256(system prompt), temperature, normalized user text)
+
+so a changed prompt, model or temperature never serves an old answer.
+Entries expire after `ttl_seconds`; past `max_entries` the least
+recently used rows are evicted. A QueryCache (db/query_cache.py) in
+front of the file answers repeats within the process from memory, so a
+repeated question costs a dict lookup instead of a 30 s API call.
+
+    cache = get_response_cache()
+    answer = cache.get(model, system_prompt, temperature, text)
+    if answer is None:
+        answer = ...call the API...
+        cache.put(model, system_prompt, temperature, text, answer)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from db.config import BUSY_TIMEOUT_MS, LLM_CACHE_PATH
+from db.query_cache import QueryCache, normalize_query
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+HOT_ENTRIES = 1024
+
+# the hot tier ignores listing writes: answers do not depend on them
+_HOT_GENERATION = 0
+
+
+def cache_key(model: str, system_prompt: str, temperature: float, user_text: str) -> str:
+    prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+    material = json.dumps(
+        [model, prompt_hash, round(float(temperature), 3), normalize_query(user_text)]
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed TTL / LRU answer cache with an in-memory hot tier."""
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hot = QueryCache(max_entries=HOT_ENTRIES, ttl_seconds=min(ttl_seconds, 3600))
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses(last_used)"
+        )
+
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, model: str, system_prompt: str, temperature: float, user_text: str) -> Optional[str]:
+        key = cache_key(model, system_prompt, temperature, user_text)
+
+        answer = self.hot.get(key, generation=_HOT_GENERATION)
+        if answer is not None:
+            return answer
+
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or row[1] + self.ttl_seconds < now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._conn.execute(
+                "UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key)
+            )
+            self.disk_hits += 1
+
+        # never outlive the row's own expiry
+        self.hot.put(
+            key, row[0], generation=_HOT_GENERATION,
+            ttl_seconds=row[1] + self.ttl_seconds - now,
+        )
+        return row[0]
+
+    def put(self, model: str, system_prompt: str, temperature: float, user_text: str, response: str) -> None:
+        key = cache_key(model, system_prompt, temperature, user_text)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO llm_responses(key, model, response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, model, response, now, now),
+            )
+            self._evict(now)
+
+        self.hot.put(key, response, generation=_HOT_GENERATION)
+
+    def _evict(self, now: float) -> None:
+        expired = self._conn.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?",
+            (now - self.ttl_seconds,),
+        ).rowcount
+
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                """
+                DELETE FROM llm_responses WHERE key IN (
+                    SELECT key FROM llm_responses ORDER BY last_used LIMIT ?
+                )
+                """,
+                (overflow,),
+            )
+        self.evictions += expired + max(overflow, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+        self.hot.clear()
+
+    def stats(self) -> Dict[str, float]:
+        hot = self.hot.stats()
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()
+            lookups = hot["hits"] + self.disk_hits + self.misses
+            return {
+                "entries": entries,
+                "hot_entries": hot["entries"],
+                "hot_hits": hot["hits"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((hot["hits"] + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -1,24 +1,39 @@
 import os
 import math
-import requests
 from dotenv import load_dotenv
 
+from core import http_client
+from core.single_flight import SingleFlight
+from db.query_cache import normalize_query
+
 load_dotenv()
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 
-def search_online(query):
-    r = requests.get(
+# Identical in-flight searches share one call (core/single_flight.py)
+FLIGHTS = SingleFlight()
+FLIGHT_TIMEOUT = 60
+
+def _fetch_online(query):
+    r = http_client.get(
         "https://serpapi.com/search",
         params={
             "engine": "google_maps",
             "q": query,
             "api_key": SERPAPI_KEY
-        },
-        timeout=30
+        }
     )
     r.raise_for_status()
     return r.json().get("local_results", [])
 
+def search_online(query):
+    results = FLIGHTS.do(
+        ("serpapi", normalize_query(query)),
+        lambda: _fetch_online(query),
+        timeout=FLIGHT_TIMEOUT
+    )
+    # callers may reorder / annotate; keep the shared result intact
+    return list(results)
+
 def rank_online_results(results):
     def score(r):
         return (
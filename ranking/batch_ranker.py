@@ -0,0 +1,238 @@
+# ranking/batch_ranker.py
+"""
+Vectorized feature computation for db.db.rank_results.
+
+Columns are pulled out of the candidate rows once and every ranking
+feature is computed as a NumPy array operation over the whole batch.
+The arithmetic is kept in the same order as the original per-row loop,
+so heuristic scores are identical to the row-by-row version.
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from db.normalize import normalize_text
+
+INFO_FIELDS = [
+    "website",
+    "phone_number",
+    "address",
+    "category",
+    "subcategory",
+    "city",
+    "state",
+]
+
+# Columns whose tokens count toward query relevance
+RELEVANCE_FIELDS = ["name", "category", "subcategory", "area"]
+
+DEFAULT_RATING = 3.5        # neutral default for unrated local businesses
+FRESHNESS_DAYS = 180
+FRESHNESS_BOOST = 0.1
+INFO_BOOST_WEIGHT = 0.5
+RELEVANCE_WEIGHT = 0.3
+
+
+@lru_cache(maxsize=65536)
+def _tokens(text: str) -> frozenset:
+    # category / subcategory / area values repeat a lot across rows
+    return frozenset(normalize_text(text).split()) if text else frozenset()
+
+
+def _column(rows: Sequence[Dict], field: str) -> List:
+    return [r.get(field) for r in rows]
+
+
+def _float_column(values: List, default: float) -> np.ndarray:
+    return np.array(
+        [default if v is None else v for v in values],
+        dtype=np.float64,
+    )
+
+
+def _filled_mask(values: List) -> np.ndarray:
+    return np.fromiter(
+        (bool(v) and bool(str(v).strip()) for v in values),
+        dtype=bool,
+        count=len(values),
+    )
+
+
+def _parse_created(values: List) -> np.ndarray:
+    """created_at strings -> datetime64[us]; unparseable values -> NaT."""
+    try:
+        return np.array(
+            [v if v else "NaT" for v in values],
+            dtype="datetime64[us]",
+        )
+    except (ValueError, TypeError):
+        parsed = []
+        for v in values:
+            try:
+                parsed.append(np.datetime64(datetime.fromisoformat(v), "us"))
+            except Exception:
+                parsed.append(np.datetime64("NaT"))
+        return np.array(parsed, dtype="datetime64[us]")
+
+
+# ============================================================
+# Feature columns
+# ============================================================
+def rating_and_reviews(rows: Sequence[Dict]):
+    rating = _float_column(_column(rows, "reviews_average"), DEFAULT_RATING)
+    reviews = np.array(
+        [v or 0 for v in _column(rows, "reviews_count")],
+        dtype=np.float64,
+    )
+    return rating, reviews
+
+
+def base_scores(rating: np.ndarray, reviews: np.ndarray) -> np.ndarray:
+    return rating * 0.75 + reviews * 0.002
+
+
+def info_completeness(rows: Sequence[Dict]) -> np.ndarray:
+    filled = np.zeros(len(rows), dtype=np.int64)
+    for f in INFO_FIELDS:
+        filled += _filled_mask(_column(rows, f))
+    return filled / len(INFO_FIELDS)
+
+
+def freshness(rows: Sequence[Dict], now: datetime) -> np.ndarray:
+    """
+    FRESHNESS_BOOST where (now - created_at).days <= FRESHNESS_DAYS,
+    i.e. created_at > now - (FRESHNESS_DAYS + 1) days.
+    """
+    created = _parse_created(_column(rows, "created_at"))
+    cutoff = np.datetime64(now - timedelta(days=FRESHNESS_DAYS + 1), "us")
+    fresh = (created > cutoff) & ~np.isnat(created)
+    return np.where(fresh, FRESHNESS_BOOST, 0.0)
+
+
+def _relevance_hits(r: Dict, query_tokens: set) -> int:
+    # tokens of "name category subcategory area" == union of per-field tokens;
+    # the pre-normalized <field>_norm column is used when the row has it
+    hits = set()
+    for f in RELEVANCE_FIELDS:
+        text = r.get(f"{f}_norm")
+        if text is None:
+            text = f"{r.get(f, '')}"
+        hits |= query_tokens & _tokens(text)
+    return len(hits)
+
+
+def relevance(rows: Sequence[Dict], query_tokens: set) -> np.ndarray:
+    if not query_tokens:
+        return np.zeros(len(rows), dtype=np.float64)
+
+    matches = np.fromiter(
+        (_relevance_hits(r, query_tokens) for r in rows),
+        dtype=np.float64,
+        count=len(rows),
+    )
+    return matches / max(len(query_tokens), 1)
+
+
+def popularity(reviews: np.ndarray) -> np.ndarray:
+    return np.log1p(reviews)
+
+
+def closed_mask(rows: Sequence[Dict]) -> np.ndarray:
+    return np.fromiter(
+        (
+            "permanently closed" in f"{r.get('name','')} {r.get('address','')}".lower()
+            for r in rows
+        ),
+        dtype=bool,
+        count=len(rows),
+    )
+
+
+def _stored(rows: Sequence[Dict], field: str):
+    """
+    Precomputed column (see db/derived.py) as an array, or None if any
+    row lacks it and the feature has to be computed on the fly.
+    """
+    values = _column(rows, field)
+    if any(v is None for v in values):
+        return None
+    return np.array(values, dtype=np.float64)
+
+
+# ============================================================
+# Batch scoring
+# ============================================================
+def score_batch(rows: Sequence[Dict], query_tokens: set, now: datetime) -> Dict[str, np.ndarray]:
+    """
+    Compute every ranking feature for a batch of candidate rows.
+
+    Returns arrays keyed by name, plus `features`: a C-contiguous float32
+    matrix (base_score, info_ratio, relevance, popularity) for the ML model.
+    """
+    rating, reviews = rating_and_reviews(rows)
+
+    # static features come precomputed from the DB when available
+    base = _stored(rows, "rank_base_score")
+    if base is None:
+        base = base_scores(rating, reviews)
+
+    info_ratio = _stored(rows, "rank_info_ratio")
+    if info_ratio is None:
+        info_ratio = info_completeness(rows)
+
+    pop = _stored(rows, "rank_popularity")
+    if pop is None:
+        pop = popularity(reviews)
+
+    # query / time dependent features
+    fresh = freshness(rows, now)
+    rel = relevance(rows, query_tokens)
+
+    score = (
+        base +
+        info_ratio * INFO_BOOST_WEIGHT +
+        fresh +
+        rel * RELEVANCE_WEIGHT
+    )
+
+    features = np.ascontiguousarray(
+        np.column_stack([base, info_ratio, rel, pop]),
+        dtype=np.float32,
+    )
+
+    return {
+        "rating": rating,
+        "reviews": reviews,
+        "base_score": base,
+        "info_ratio": info_ratio,
+        "relevance": rel,
+        "popularity": pop,
+        "score": score,
+        "features": features,
+    }
+
+
+def predict_scores(model, features: np.ndarray):
+    """
+    Score a feature matrix with the optional ML model.
+    Returns None if the model cannot use these features.
+    """
+    try:
+        return model.predict(features)
+    except ValueError:
+        # feature mismatch protection
+        expected = getattr(model, "n_features_in_", None)
+        if expected:
+            return model.predict(np.ascontiguousarray(features[:, :expected]))
+        return None
+
+
+def ranking_order(score: np.ndarray, info_score: np.ndarray,
+                  rating: np.ndarray, reviews: np.ndarray) -> np.ndarray:
+    """
+    Indices sorted by (score, info_score, rating, reviews) descending.
+    Stable: equal keys keep candidate order, like list.sort(reverse=True).
+    """
+    return np.lexsort((-reviews, -rating, -info_score, -score))